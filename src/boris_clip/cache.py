@@ -0,0 +1,87 @@
+"""On-disk cache for results derived from input files.
+
+Entries live under ``$XDG_CACHE_HOME/boris-clip`` (``~/.cache/boris-clip``
+by default) and are keyed on the source file's resolved path, modification
+time and size plus the boris-clip version, so edited files and upgrades
+never see stale results. The cache is best-effort: any error reading or
+writing it is treated as a miss.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+from . import __version__
+
+# Least recently used entries are evicted once the cache grows past this
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+
+
+def cache_dir() -> Path:
+    """Return the directory cache entries are stored in."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return Path(base) / "boris-clip"
+
+
+def file_key(path: Path, kind: str) -> str:
+    """Return the cache key for the result of type *kind* derived from *path*."""
+    stat = path.stat()
+    raw = repr((kind, str(path.resolve()), stat.st_mtime_ns, stat.st_size, __version__))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def load(key: str):
+    """Return the value stored under *key*, or ``None`` on a miss."""
+    entry = cache_dir() / f"{key}.pkl"
+    try:
+        with open(entry, "rb") as f:
+            value = pickle.load(f)
+    except Exception:
+        return None
+    try:
+        os.utime(entry)  # mark as recently used for eviction
+    except OSError:
+        pass
+    return value
+
+
+def store(key: str, value) -> None:
+    """Store *value* under *key*, evicting old entries if the cache is full."""
+    directory = cache_dir()
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so concurrent runs never read a
+        # partially written entry
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, directory / f"{key}.pkl")
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except Exception:
+        return
+    _evict(directory)
+
+
+def _evict(directory: Path, max_bytes: int = MAX_CACHE_BYTES) -> None:
+    """Delete the least recently used entries until the cache fits *max_bytes*."""
+    entries = []
+    for entry in directory.glob("*.pkl"):
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry))
+
+    total = 0
+    for _, size, entry in sorted(entries, key=lambda e: e[0], reverse=True):
+        total += size
+        if total > max_bytes:
+            try:
+                entry.unlink()
+            except OSError:
+                pass
@@ -1,12 +1,25 @@
 """Command-line interface for boris-clip."""
 
+import contextlib
+import io
+import shutil
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import click
 
-from .clip import extract_all_clips
-from .models import ParsedAnnotations, VideoInfo
+from .cli_utils import abort
+from . import pyav_backend
+from .clip import (
+    HW_ENCODERS,
+    available_cpus,
+    available_encoders,
+    default_jobs,
+    extract_all_clips,
+    update_manifest,
+)
+from .models import Bout, ParsedAnnotations, VideoInfo
 from .parse import parse_boris_file
 from .probe import probe_video
 from .validate import validate
@@ -30,10 +43,11 @@ def _warn_pretty(text: str) -> None:
     click.echo(click.style(f"  Warning: {text}", fg="yellow"), err=True)
 
 
-def _progress(current: int, total: int, path: Path) -> None:
+def _progress(current: int, total: int, path: Path, cached: bool = False) -> None:
     width = len(str(total))
     idx = click.style(f"[{current:{width}d}/{total}]", dim=True)
-    click.echo(f"  {idx} {path.name}")
+    suffix = click.style(" (up to date)", dim=True) if cached else ""
+    click.echo(f"  {idx} {path.name}{suffix}")
 
 
 # ---------------------------------------------------------------------------
@@ -124,6 +138,199 @@ def _match_observations(
     return matched
 
 
+# ---------------------------------------------------------------------------
+# Per-observation processing
+# ---------------------------------------------------------------------------
+
+def _prepare_observation(
+    obs: ParsedAnnotations,
+    video_path: str,
+    behaviours: tuple[str, ...],
+    force: bool,
+    use_cache: bool,
+    extract_options: dict,
+) -> tuple[VideoInfo, list[Bout]] | None:
+    """Probe and validate one observation and print what will be extracted.
+
+    Returns the probed video and the bouts to extract, or ``None`` if the
+    observation is skipped. Aborts if validation fails.
+    """
+    label = obs.obs_id or obs.media_filename or video_path
+    _header(f"Observation: {label}")
+
+    if not obs.bouts:
+        _warn_pretty("No bouts found — skipping.")
+        return None
+
+    if not Path(video_path).exists():
+        _warn_pretty(f"Video not found: {video_path!r} — skipping.")
+        return None
+
+    _item("Video", video_path)
+    video_info: VideoInfo = probe_video(
+        video_path, use_cache=use_cache, ffprobe_bin=extract_options["ffprobe_bin"]
+    )
+    _item("Duration", f"{video_info.duration:.3f}s")
+    _item("FPS", f"{video_info.fps:.4f}")
+
+    validate(obs, video_info, force=force)
+
+    bouts = obs.bouts
+    if behaviours:
+        bouts = [b for b in bouts if b.behaviour in behaviours]
+        if not bouts:
+            _warn_pretty(
+                f"No bouts matched the requested behaviour(s): "
+                f"{', '.join(repr(b) for b in behaviours)} — skipping."
+            )
+            return None
+
+    opts = extract_options
+    n_state = sum(1 for b in bouts if not b.is_point)
+    n_point = sum(1 for b in bouts if b.is_point)
+    _item("Bouts", f"{len(bouts)}  ({n_state} state, {n_point} point)")
+    if behaviours:
+        _item("Behaviour filter", ", ".join(behaviours))
+    if opts["max_duration"] is not None:
+        _item("Max duration", f"{opts['max_duration']:.1f}s")
+    if opts["max_clips"] is not None:
+        _item("Max clips", f"{opts['max_clips']} per (behaviour, subject)")
+    if n_state > 0:
+        _item(
+            "State padding", f"pre {opts['padding_pre']:.1f}s  /  post {opts['padding_post']:.1f}s"
+        )
+    if n_point > 0:
+        _item(
+            "Point padding",
+            f"pre {opts['point_padding_pre']:.1f}s  /  post {opts['point_padding_post']:.1f}s",
+        )
+    if opts["fast"]:
+        _item("Mode", "stream-copy (--fast)")
+    else:
+        mode = "re-encode"
+        if opts["encoder"] is not None:
+            mode += f" ({HW_ENCODERS[opts['encoder']][0]})"
+        if opts["fast_points"] and n_point > 0:
+            mode += ", stream-copy for point events (--fast-points)"
+        _item("Mode", mode)
+    _item("Output", f"{opts['output_dir']}/")
+
+    click.echo("")
+    return video_info, bouts
+
+
+def _process_observation(
+    obs: ParsedAnnotations,
+    video_path: str,
+    behaviours: tuple[str, ...],
+    force: bool,
+    use_cache: bool,
+    extract_options: dict,
+) -> list[Path]:
+    """Probe, validate and extract the clips of one observation."""
+    prepared = _prepare_observation(obs, video_path, behaviours, force, use_cache, extract_options)
+    if prepared is None:
+        return []
+    video_info, bouts = prepared
+    return extract_all_clips(
+        bouts=bouts, video=video_info, progress_callback=_progress, **extract_options
+    )
+
+
+class _CapturedOutput(io.StringIO):
+    """Buffer for a worker's output that keeps the parent's colour handling."""
+
+    def __init__(self, isatty: bool) -> None:
+        super().__init__()
+        self._isatty = isatty
+
+    def isatty(self) -> bool:
+        return self._isatty
+
+
+def _captured(func, ttys: tuple[bool, bool], *args) -> tuple:
+    """Call ``func(*args)`` with its output captured.
+
+    Returns ``(result, stdout, stderr, exit_code)``; ``exit_code`` is set if
+    the call aborted.
+    """
+    out, err = _CapturedOutput(ttys[0]), _CapturedOutput(ttys[1])
+    result = exit_code = None
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        try:
+            result = func(*args)
+        except SystemExit as e:
+            exit_code = e.code
+    return result, out.getvalue(), err.getvalue(), exit_code
+
+
+def _extract_observation(
+    video_info: VideoInfo, bouts: list[Bout], extract_options: dict
+) -> tuple[list[Path], dict[str, str]]:
+    """Extract one prepared observation in a worker.
+
+    Returns the clips created and their manifest entries, which the parent
+    writes once all workers are done so that they cannot overwrite each
+    other's.
+    """
+    entries: dict[str, str] = {}
+    created = extract_all_clips(
+        bouts=bouts, video=video_info, progress_callback=_progress,
+        manifest_entries=entries, **extract_options,
+    )
+    return created, entries
+
+
+def _process_in_parallel(work: list[tuple], workers: int) -> list[Path]:
+    """Process observations in worker processes, printing them in order.
+
+    Every observation is probed and validated here first, so an abort stops
+    the run before any clip is extracted; workers only extract.
+    """
+    ttys = (sys.stdout.isatty(), sys.stderr.isatty())
+    prepared = []
+    for item in work:
+        result, out, err, exit_code = _captured(_prepare_observation, ttys, *item)
+        prepared.append((result, out, err))
+        if exit_code is not None:
+            for _, out, err in prepared:
+                sys.stdout.write(out)
+                sys.stderr.write(err)
+            sys.exit(exit_code)
+
+    created: list[Path] = []
+    entries: dict[str, str] = {}
+    output_dir = work[0][-1]["output_dir"]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            None if result is None
+            else pool.submit(_captured, _extract_observation, ttys, *result, item[-1])
+            for (result, _, _), item in zip(prepared, work)
+        ]
+        try:
+            for (_, prep_out, prep_err), future in zip(prepared, futures):
+                sys.stdout.write(prep_out)
+                sys.stderr.write(prep_err)
+                if future is None:
+                    continue
+                result, out, err, exit_code = future.result()
+                sys.stdout.write(out)
+                sys.stderr.write(err)
+                if exit_code is not None:
+                    # Observations that have not started are cancelled; ones
+                    # already running finish, but are not recorded in the
+                    # manifest, so the next run extracts them again
+                    pool.shutdown(cancel_futures=True)
+                    sys.exit(exit_code)
+                obs_created, obs_entries = result
+                created.extend(obs_created)
+                entries.update(obs_entries)
+        finally:
+            if entries:
+                update_manifest(output_dir, entries)
+    return created
+
+
 # ---------------------------------------------------------------------------
 # CLI
 # ---------------------------------------------------------------------------
@@ -171,6 +378,27 @@ def _match_observations(
         "the nearest keyframe so clips may start/end slightly off."
     ),
 )
+@click.option(
+    "--fast-points", is_flag=True, default=False,
+    help=(
+        "Stream-copy point-event clips only; state-event clips are still "
+        "re-encoded. Point clips may start/end slightly off."
+    ),
+)
+@click.option(
+    "--backend", type=click.Choice(["ffmpeg", "pyav"]), default="ffmpeg",
+    help=(
+        "How stream-copied clips (--fast, --fast-points) are cut: by ffmpeg "
+        "processes, or in-process with PyAV (requires the 'av' package)."
+    ),
+)
+@click.option(
+    "--hwaccel", type=click.Choice(sorted(HW_ENCODERS)), default=None,
+    help=(
+        "Re-encode with a hardware encoder (NVENC, VAAPI, Quick Sync or "
+        "VideoToolbox). Falls back to software encoding if unavailable."
+    ),
+)
 @click.option(
     "--force", is_flag=True, default=False,
     help="Treat media-file mismatch and out-of-bounds errors as warnings rather than errors.",
@@ -191,6 +419,31 @@ def _match_observations(
     "--max-clips", type=int, default=None, metavar="N",
     help="Maximum number of clips to extract per (behaviour, subject) group. Earlier bouts take priority.",
 )
+@click.option(
+    "--force-rebuild", is_flag=True, default=False,
+    help="Extract every clip again, even if an up-to-date clip from an earlier run exists.",
+)
+@click.option(
+    "--no-cache", is_flag=True, default=False,
+    help=(
+        "Always re-parse the BORIS file and re-probe the videos instead of reusing "
+        "the results of an earlier run."
+    ),
+)
+@click.option(
+    "--jobs", "-j", type=click.IntRange(min=1), default=None, metavar="N",
+    help=(
+        "Number of clips to extract in parallel, shared between observations "
+        "when there are several. Defaults to half the CPU cores."
+    ),
+)
+@click.option(
+    "--codec-threads", type=click.IntRange(min=1), default=None, metavar="N",
+    help=(
+        "Threads per ffmpeg decoder/encoder when re-encoding. "
+        "Defaults to sharing the CPU cores between the clips being encoded."
+    ),
+)
 @click.version_option()
 def main(
     boris_file: str,
@@ -203,10 +456,17 @@ def main(
     point_padding_pre: float | None,
     point_padding_post: float | None,
     fast: bool,
+    fast_points: bool,
+    backend: str,
+    hwaccel: str | None,
     force: bool,
     behaviours: tuple[str, ...],
     max_duration: float | None,
     max_clips: int | None,
+    force_rebuild: bool,
+    no_cache: bool,
+    jobs: int | None,
+    codec_threads: int | None,
 ) -> None:
     """Extract video clips for each behavioural bout in a BORIS annotation file.
 
@@ -246,10 +506,33 @@ def main(
         pre, post, point_padding, point_padding_pre, point_padding_post, any_padding_specified
     )
 
+    # Resolve ffmpeg and ffprobe once rather than on every spawn
+    ffmpeg_bin = shutil.which("ffmpeg")
+    if ffmpeg_bin is None:
+        abort("ffmpeg not found. Please ensure ffmpeg is installed and on your PATH.")
+    ffprobe_bin = shutil.which("ffprobe")
+    if ffprobe_bin is None:
+        abort("ffprobe not found. Please ensure ffmpeg is installed and on your PATH.")
+
+    if backend == "pyav" and not pyav_backend.is_available():
+        _warn_pretty("--backend pyav requires the 'av' package — falling back to ffmpeg.")
+        backend = "ffmpeg"
+
+    if hwaccel is not None and fast:
+        _warn_pretty("--hwaccel has no effect with --fast (stream-copy does not re-encode).")
+        hwaccel = None
+    if hwaccel is not None:
+        hw_encoder = HW_ENCODERS[hwaccel][0]
+        if hw_encoder not in available_encoders(ffmpeg_bin):
+            _warn_pretty(
+                f"ffmpeg was built without {hw_encoder!r} — falling back to software encoding."
+            )
+            hwaccel = None
+
     # -- Parse BORIS file -------------------------------------------------------
     _header("Parsing BORIS file")
     _item("Path", boris_file)
-    observations = parse_boris_file(boris_file)
+    observations = parse_boris_file(boris_file, use_cache=not no_cache)
     _item("Observations", str(len(observations)))
     _item("Format", observations[0].source_format if observations else "unknown")
 
@@ -264,66 +547,40 @@ def main(
     # -- Process each matched pair ---------------------------------------------
     total_created: list[Path] = []
 
-    for obs, video_path in matched:
-        label = obs.obs_id or obs.media_filename or video_path
-        _header(f"Observation: {label}")
-
-        if not obs.bouts:
-            _warn_pretty("No bouts found — skipping.")
-            continue
-
-        if not Path(video_path).exists():
-            _warn_pretty(f"Video not found: {video_path!r} — skipping.")
-            continue
-
-        _item("Video", video_path)
-        video_info: VideoInfo = probe_video(video_path)
-        _item("Duration", f"{video_info.duration:.3f}s")
-        _item("FPS", f"{video_info.fps:.4f}")
-
-        validate(obs, video_info, force=force)
+    # Observations are independent, so several can run at once; the --jobs
+    # budget is split between them so ffmpeg is not oversubscribed
+    total_jobs = jobs if jobs is not None else default_jobs()
+    workers = min(len(matched), total_jobs)
+    extract_options = dict(
+        output_dir=Path(output_dir),
+        padding_pre=pre,
+        padding_post=post,
+        point_padding_pre=pt_pre,
+        point_padding_post=pt_post,
+        max_duration=max_duration,
+        max_clips=max_clips,
+        fast=fast,
+        jobs=max(1, total_jobs // workers),
+        encoder=hwaccel,
+        ffmpeg_bin=ffmpeg_bin,
+        ffprobe_bin=ffprobe_bin,
+        force_rebuild=force_rebuild,
+        codec_threads=codec_threads,
+        fast_points=fast_points,
+        backend=backend,
+        cpu_budget=max(1, available_cpus() // workers),
+        use_cache=not no_cache,
+    )
+    work = [
+        (obs, video_path, behaviours, force, not no_cache, extract_options)
+        for obs, video_path in matched
+    ]
 
-        bouts = obs.bouts
-        if behaviours:
-            bouts = [b for b in bouts if b.behaviour in behaviours]
-            if not bouts:
-                _warn_pretty(
-                    f"No bouts matched the requested behaviour(s): "
-                    f"{', '.join(repr(b) for b in behaviours)} — skipping."
-                )
-                continue
-
-        n_state = sum(1 for b in bouts if not b.is_point)
-        n_point = sum(1 for b in bouts if b.is_point)
-        _item("Bouts", f"{len(bouts)}  ({n_state} state, {n_point} point)")
-        if behaviours:
-            _item("Behaviour filter", ", ".join(behaviours))
-        if max_duration is not None:
-            _item("Max duration", f"{max_duration:.1f}s")
-        if max_clips is not None:
-            _item("Max clips", f"{max_clips} per (behaviour, subject)")
-        if n_state > 0:
-            _item("State padding", f"pre {pre:.1f}s  /  post {post:.1f}s")
-        if n_point > 0:
-            _item("Point padding", f"pre {pt_pre:.1f}s  /  post {pt_post:.1f}s")
-        _item("Mode", "stream-copy (--fast)" if fast else "re-encode")
-        _item("Output", f"{output_dir}/")
-
-        click.echo("")
-        created = extract_all_clips(
-            bouts=bouts,
-            video=video_info,
-            output_dir=Path(output_dir),
-            padding_pre=pre,
-            padding_post=post,
-            point_padding_pre=pt_pre,
-            point_padding_post=pt_post,
-            max_duration=max_duration,
-            max_clips=max_clips,
-            fast=fast,
-            progress_callback=_progress,
-        )
-        total_created.extend(created)
+    if workers > 1:
+        total_created = _process_in_parallel(work, workers)
+    else:
+        for item in work:
+            total_created.extend(_process_observation(*item))
 
     # -- Summary ---------------------------------------------------------------
     click.echo("")
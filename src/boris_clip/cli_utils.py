@@ -6,13 +6,34 @@ if richer behaviour is needed — but the defaults work fine standalone.
 """
 
 import sys
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+_recorders: list[list[str]] = []
 
 
 def warn(message: str) -> None:
     """Emit a warning to stderr."""
+    for recorder in _recorders:
+        recorder.append(message)
     print(f"Warning: {message}", file=sys.stderr)
 
 
+@contextmanager
+def recording_warnings() -> Iterator[list[str]]:
+    """Collect the messages passed to :func:`warn` inside the block.
+
+    Warnings are still printed; recording them lets cached results replay
+    the warnings their original computation emitted.
+    """
+    messages: list[str] = []
+    _recorders.append(messages)
+    try:
+        yield messages
+    finally:
+        _recorders.remove(messages)
+
+
 def abort(message: str) -> None:
     """Print an error message and exit with code 1."""
     print(f"Error: {message}", file=sys.stderr)
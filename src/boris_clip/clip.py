@@ -1,23 +1,48 @@
 """ffmpeg-based clip extraction."""
 
+import functools
+import json
+import os
 import re
+import shutil
 import subprocess
+import tempfile
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import numpy as np
+
+from . import pyav_backend
 from .cli_utils import abort, warn
 
 from .models import Bout, VideoInfo
+from .probe import probe_keyframes
+
+
+# Every ASCII character other than [A-Za-z0-9_-] maps to "_"
+_UNSAFE_ASCII = str.maketrans(
+    {chr(c): "_" for c in range(128) if not (chr(c).isalnum() or chr(c) in "_-")}
+)
+_UNSAFE_CHARS = re.compile(r"[^\w\-]")
+_UNDERSCORE_RUNS = re.compile(r"_{2,}")
 
 
+# Names repeat across bouts, so each distinct label is only sanitised once
+@functools.lru_cache(maxsize=4096)
 def _sanitise_name(name: str) -> str:
     """Convert a BORIS name to a safe filename component."""
     name = name.strip()
-    name = re.sub(r"[^\w\-]", "_", name)  # replace non-word chars with _
-    name = re.sub(r"_+", "_", name)  # collapse multiple underscores
+    if name.isascii():
+        name = name.translate(_UNSAFE_ASCII)
+    else:
+        name = _UNSAFE_CHARS.sub("_", name)  # keeps non-ASCII word characters
+    if "__" in name:
+        name = _UNDERSCORE_RUNS.sub("_", name)  # collapse multiple underscores
     return name.strip("_")
 
 
-_NO_FOCAL_SUBJECT_LABELS = {"", "no focal subject", "no-focal-subject"}
+_NO_FOCAL_SUBJECT_NAME = "no-focal-subject"
 
 
 def build_output_path(
@@ -48,18 +73,443 @@ def build_output_path(
     original_stop:
         Unpadded stop time, used in the filename.
     """
-    video_stem = Path(video.filename).stem
-    behaviour = _sanitise_name(bout.behaviour)
+    filename = _clip_filename(
+        Path(video.filename).stem,
+        _sanitise_name(bout.behaviour),
+        _subject_component(bout),
+        original_start,
+        original_stop,
+    )
+    return output_dir / filename
 
-    if bout.subject.strip().lower() in _NO_FOCAL_SUBJECT_LABELS:
-        subject = "no-focal-subject"
-    else:
-        subject = _sanitise_name(bout.subject)
 
+def _subject_component(bout: Bout) -> str:
+    """Return the filename component for a bout's subject."""
+    if bout.is_no_focal_subject:
+        return _NO_FOCAL_SUBJECT_NAME
+    return _sanitise_name(bout.subject)
+
+
+_CLIP_NAME = "%s_%s_%s_%.3f-%.3f.mp4"
+
+
+def _clip_filename(
+    video_stem: str,
+    behaviour: str,
+    subject: str,
+    original_start: float,
+    original_stop: float,
+) -> str:
+    """Join already-sanitised components into a clip filename."""
+    if video_stem and behaviour and subject:
+        return _CLIP_NAME % (video_stem, behaviour, subject, original_start, original_stop)
+    # A component sanitised down to nothing is left out rather than leaving
+    # a double underscore
     interval = f"{original_start:.3f}-{original_stop:.3f}"
     parts = [video_stem, behaviour, subject, interval]
-    filename = "_".join(p for p in parts if p) + ".mp4"
-    return output_dir / filename
+    return "_".join(p for p in parts if p) + ".mp4"
+
+
+# Upper bound on clips handled by one ffmpeg process. Each clip gets its own
+# demuxer (and encoder when re-encoding), so this also caps memory use.
+_MAX_BATCH_SIZE = 16
+
+# Hardware encoders for re-encoding, keyed by the name used on the CLI:
+# (ffmpeg encoder, global options, options per input, options per output)
+HW_ENCODERS: dict[str, tuple[str, list[str], list[str], list[str]]] = {
+    "nvenc": (
+        "h264_nvenc",
+        [],
+        ["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"],
+        ["-c:v", "h264_nvenc", "-preset", "p4"],
+    ),
+    "vaapi": (
+        "h264_vaapi",
+        ["-vaapi_device", "/dev/dri/renderD128"],
+        ["-hwaccel", "vaapi", "-hwaccel_output_format", "vaapi"],
+        ["-c:v", "h264_vaapi"],
+    ),
+    "qsv": (
+        "h264_qsv",
+        [],
+        ["-hwaccel", "qsv", "-hwaccel_output_format", "qsv"],
+        ["-c:v", "h264_qsv"],
+    ),
+    "videotoolbox": (
+        "h264_videotoolbox",
+        [],
+        ["-hwaccel", "videotoolbox"],
+        ["-c:v", "h264_videotoolbox"],
+    ),
+}
+
+
+def available_encoders(ffmpeg_bin: str = "ffmpeg") -> set[str]:
+    """Return the names of the encoders compiled into the local ffmpeg."""
+    try:
+        result = subprocess.run(
+            [ffmpeg_bin, "-hide_banner", "-encoders"],
+            capture_output=True,
+            text=True,
+        )
+    except FileNotFoundError:
+        abort("ffmpeg not found. Please ensure ffmpeg is installed and on your PATH.")
+    # Encoder lines look like " V....D libx264   libx264 H.264 ..."; the
+    # legend above them (" V..... = Video") is skipped by the "=" check.
+    names = set()
+    for line in result.stdout.splitlines():
+        fields = line.split()
+        if len(fields) >= 2 and len(fields[0]) == 6 and fields[1] != "=":
+            names.add(fields[1])
+    return names
+
+
+def _build_command(
+    clips: list[tuple[Bout, Path]],
+    video: VideoInfo,
+    fast: bool,
+    encoder: str | None = None,
+    ffmpeg_bin: str = "ffmpeg",
+    threads: int = 0,
+    copy_audio: bool = False,
+) -> list[str]:
+    """Build one ffmpeg argv that writes every clip in ``clips``.
+
+    Each clip opens the source as its own input so that seeking stays
+    per-clip, and is mapped onto its own output file. ``encoder`` selects a
+    hardware encoder from :data:`HW_ENCODERS` and is ignored in fast mode.
+    ``threads`` caps the threads of each software decoder and encoder
+    (``0`` lets ffmpeg pick). With ``copy_audio`` only the video is
+    re-encoded and the audio stream is copied.
+    """
+    hw = HW_ENCODERS[encoder] if encoder is not None and not fast else None
+    cmd = [ffmpeg_bin, "-y", "-nostdin", "-loglevel", "error"]
+    if hw is not None:
+        cmd += hw[1]
+    for bout, _ in clips:
+        cmd += _input_options(fast, hw, threads)
+        # Seek before the input so ffmpeg jumps to the clip at the container
+        # level instead of decoding everything from t=0. With re-encoding,
+        # ffmpeg's default -accurate_seek still makes the cut frame-accurate;
+        # with stream copy it snaps to the nearest keyframe.
+        cmd += ["-ss", f"{bout.start:.6f}", "-t", f"{bout.duration:.6f}", "-i", video.path]
+
+    for index, (_, output_path) in enumerate(clips):
+        cmd += ["-map", f"{index}:v:0", "-map", f"{index}:a:0?"]
+        cmd += _output_options(fast, hw, threads, copy_audio)
+        cmd.append(str(output_path))
+    return cmd
+
+
+def _input_options(fast: bool, hw: tuple | None, threads: int) -> list[str]:
+    """Decoder options for one input."""
+    if fast:
+        return []
+    if hw is not None:
+        return hw[2]
+    return ["-threads", str(threads)]
+
+
+def _output_options(
+    fast: bool, hw: tuple | None, threads: int = 0, copy_audio: bool = False
+) -> list[str]:
+    """Codec options for one output file."""
+    if fast:
+        return ["-c", "copy"]
+    video = hw[3] if hw is not None else ["-threads", str(threads)]
+    if copy_audio:
+        # Copied audio starts at the packet before the cut. Its negative
+        # timestamps must be kept, so the MP4 edit list trims it to the cut
+        # instead of make_zero shifting it ahead of the video.
+        return video + ["-c:a", "copy"]
+    return video + ["-avoid_negative_ts", "make_zero"]
+
+
+def _build_merged_command(
+    clips: list[tuple[Bout, Path]],
+    video: VideoInfo,
+    encoder: str | None = None,
+    ffmpeg_bin: str = "ffmpeg",
+    threads: int = 0,
+) -> list[str]:
+    """Build one ffmpeg argv that re-encodes overlapping clips in one pass.
+
+    The union of the clips is decoded once and fanned out with ``split``;
+    each branch is then cut with ``trim``, which keeps exactly the frames an
+    accurate seek would, and encoded to its own output.
+    """
+    hw = HW_ENCODERS[encoder] if encoder is not None else None
+    start = min(bout.start for bout, _ in clips)
+    stop = max(bout.stop for bout, _ in clips)
+    n = len(clips)
+
+    cmd = [ffmpeg_bin, "-y", "-nostdin", "-loglevel", "error"]
+    if hw is not None:
+        cmd += hw[1]
+    # The single decoder feeds every clip, so it gets the whole thread budget
+    cmd += _input_options(False, hw, threads * n)
+    cmd += ["-ss", f"{start:.6f}", "-t", f"{stop - start:.6f}", "-i", video.path]
+
+    graph = ["[0:v:0]split=%d%s" % (n, "".join(f"[v{i}]" for i in range(n)))]
+    if video.has_audio:
+        graph.append("[0:a:0]asplit=%d%s" % (n, "".join(f"[a{i}]" for i in range(n))))
+    # Timestamps are shifted by the clip's own offset rather than its first
+    # frame so video stays in step with the sample-accurate audio cut
+    for i, (bout, _) in enumerate(clips):
+        offset = bout.start - start
+        window = f"start={offset:.6f}:end={bout.stop - start:.6f}"
+        graph.append(f"[v{i}]trim={window},setpts=PTS-{offset:.6f}/TB[ov{i}]")
+        if video.has_audio:
+            graph.append(f"[a{i}]atrim={window},asetpts=PTS-STARTPTS[oa{i}]")
+    cmd += ["-filter_complex", ";".join(graph)]
+
+    for i, (_, output_path) in enumerate(clips):
+        cmd += ["-map", f"[ov{i}]"]
+        if video.has_audio:
+            cmd += ["-map", f"[oa{i}]"]
+        cmd += _output_options(False, hw, threads)
+        cmd.append(str(output_path))
+    return cmd
+
+
+def _run_ffmpeg(cmd: list[str]) -> tuple[int, str]:
+    """Run an ffmpeg command, returning its exit code and the tail of stderr.
+
+    Only the last few stderr lines are kept, so memory use does not grow
+    with the length of the log.
+    """
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            # Buffered, so that stderr is read in blocks rather than one
+            # byte per system call while splitting it into lines
+            bufsize=1024 * 1024,
+        )
+    except FileNotFoundError:
+        abort("ffmpeg not found. Please ensure ffmpeg is installed and on your PATH.")
+    tail: deque[bytes] = deque(proc.stderr, maxlen=20)
+    returncode = proc.wait()
+    proc.stderr.close()
+    return returncode, b"".join(tail).decode("utf-8", "replace")[-500:].strip()
+
+
+def _staging_path(output_path: Path) -> Path:
+    """Return the temporary sibling a clip is written to before taking its name.
+
+    The suffix is kept so that ffmpeg still picks the container from it.
+    """
+    return output_path.with_name(f".{output_path.stem}.{os.getpid()}.tmp{output_path.suffix}")
+
+
+def _run_staged(clips: list[tuple[Bout, Path]], write) -> tuple[bool, str]:
+    """Call ``write(staged_clips)`` and move its outputs into place if it succeeds.
+
+    ``write`` writes every clip to its staging path and returns an ffmpeg-style
+    ``(returncode, stderr)`` pair. Clips only get their final names once they
+    are complete, so an interrupted or failed run never leaves a truncated
+    file that a re-run would mistake for an up-to-date clip.
+    """
+    staged = [(bout, _staging_path(output_path)) for bout, output_path in clips]
+    ok = False
+    try:
+        returncode, stderr = write(staged)
+        if returncode == 0:
+            for (_, tmp), (_, output_path) in zip(staged, clips):
+                os.replace(tmp, output_path)
+            ok = True
+    finally:
+        if not ok:
+            for _, tmp in staged:
+                tmp.unlink(missing_ok=True)
+    return ok, stderr
+
+
+# What ffmpeg reports when a copied audio stream cannot go into the output
+# container; other failures are not helped by re-encoding the audio
+_AUDIO_COPY_ERRORS = ("could not write header", "not currently supported in container")
+
+
+def _audio_copy_failed(stderr: str) -> bool:
+    """Return whether ffmpeg's *stderr* shows it could not copy the audio stream."""
+    stderr = stderr.lower()
+    return any(message in stderr for message in _AUDIO_COPY_ERRORS)
+
+
+def extract_clips(
+    clips: list[tuple[Bout, Path]],
+    video: VideoInfo,
+    fast: bool = False,
+    encoder: str | None = None,
+    ffmpeg_bin: str = "ffmpeg",
+    threads: int = 0,
+    copy_audio: bool = False,
+) -> list[Path]:
+    """Extract several clips from one video with a single ffmpeg process.
+
+    Sharing a process avoids paying ffmpeg's startup and codec set-up once
+    per clip. If the batched run fails, each clip is retried on its own so
+    that one bad bout does not take the rest of the batch down with it.
+
+    Parameters
+    ----------
+    clips:
+        ``(bout, output_path)`` pairs, where each bout carries the (possibly
+        padded) start and stop times of its clip.
+    video:
+        Source video metadata.
+    fast:
+        If ``True``, use stream-copy (fast but keyframe-imprecise).
+        If ``False`` (default), re-encode for frame-accurate cuts.
+    encoder:
+        Optional hardware encoder (a key of :data:`HW_ENCODERS`) used when
+        re-encoding. ``None`` (default) uses ffmpeg's software encoder.
+    ffmpeg_bin:
+        ffmpeg executable to run, ideally an absolute path resolved once by
+        the caller.
+    threads:
+        Threads per software decoder and encoder. ``0`` (default) lets
+        ffmpeg use every core, which oversubscribes the CPU when several
+        ffmpeg processes or clips run at once.
+    copy_audio:
+        When re-encoding, copy the audio stream instead of re-encoding it.
+        If ffmpeg fails because the audio codec cannot be copied into MP4,
+        the batch is retried once with audio re-encoded; other failures go
+        straight to the per-clip retries.
+
+    Returns
+    -------
+    list[Path]
+        Output paths of the clips that were written successfully.
+    """
+    ok, stderr = _run_staged(
+        clips,
+        lambda staged: _run_ffmpeg(
+            _build_command(
+                staged, video, fast, encoder=encoder, ffmpeg_bin=ffmpeg_bin, threads=threads,
+                copy_audio=copy_audio and not fast,
+            )
+        ),
+    )
+    if ok:
+        return [output_path for _, output_path in clips]
+    if copy_audio and not fast and _audio_copy_failed(stderr):
+        return extract_clips(
+            clips, video, encoder=encoder, ffmpeg_bin=ffmpeg_bin, threads=threads
+        )
+    if len(clips) > 1:
+        written: list[Path] = []
+        for clip in clips:
+            written += extract_clips(
+                [clip], video, fast=fast, encoder=encoder, ffmpeg_bin=ffmpeg_bin,
+                threads=threads * len(clips), copy_audio=copy_audio,
+            )
+        return written
+    warn(f"ffmpeg returned non-zero exit code for {clips[0][1].name!r}:\n{stderr}")
+    return []
+
+
+# Runs of more than _DENSE_GROUP_SIZE clips, each starting within
+# _DENSE_GAP seconds of the previous ones, are also decoded in one pass:
+# decoding the short gaps costs less than seeking (and decoding from the
+# previous keyframe) once per clip.
+_DENSE_GAP = 2.0
+_DENSE_GROUP_SIZE = 8
+
+
+def _merge_overlapping(
+    clips: list[tuple[Bout, Path]],
+    max_gap: float = 0.0,
+) -> list[list[tuple[Bout, Path]]]:
+    """Group clips whose intervals overlap, sweeping in order of start time.
+
+    With ``max_gap``, clips that start less than that many seconds after the
+    group ends are grouped too.
+    """
+    groups: list[list[tuple[Bout, Path]]] = []
+    group_stop = float("-inf")
+    for clip in sorted(clips, key=lambda c: c[0].start):
+        bout = clip[0]
+        if groups and bout.start < group_stop + max_gap:
+            groups[-1].append(clip)
+            group_stop = max(group_stop, bout.stop)
+        else:
+            groups.append([clip])
+            group_stop = bout.stop
+    return groups
+
+
+def _extract_merged(
+    clips: list[tuple[Bout, Path]],
+    video: VideoInfo,
+    encoder: str | None = None,
+    ffmpeg_bin: str = "ffmpeg",
+    threads: int = 0,
+) -> list[Path]:
+    """Re-encode overlapping clips, decoding the frames they share only once.
+
+    Falls back to :func:`extract_clips` if the single-pass run fails.
+    Returns the output paths that were written successfully.
+    """
+    ok, _ = _run_staged(
+        clips,
+        lambda staged: _run_ffmpeg(
+            _build_merged_command(
+                staged, video, encoder=encoder, ffmpeg_bin=ffmpeg_bin, threads=threads
+            )
+        ),
+    )
+    if not ok:
+        return extract_clips(
+            clips, video, encoder=encoder, ffmpeg_bin=ffmpeg_bin, threads=threads
+        )
+    return [output_path for _, output_path in clips]
+
+
+def _copy_with_pyav(
+    clips: list[tuple[Bout, Path]],
+    video: VideoInfo,
+    ffmpeg_bin: str = "ffmpeg",
+) -> list[Path]:
+    """Stream-copy clips in-process with PyAV, falling back to ffmpeg on error."""
+    def _copy(staged):
+        pyav_backend.copy_clips(staged, video)
+        return 0, ""
+
+    try:
+        _run_staged(clips, _copy)
+        return [output_path for _, output_path in clips]
+    except Exception as e:
+        warn(f"PyAV could not copy clips from {video.filename!r} ({e}) — falling back to ffmpeg.")
+        return extract_clips(clips, video, fast=True, ffmpeg_bin=ffmpeg_bin)
+
+
+def _spans_video(bout: Bout, video: VideoInfo) -> bool:
+    """Return whether a clip covers its whole source video."""
+    return bout.start <= 0.0 and bout.stop >= video.duration
+
+
+def _copy_source(
+    clips: list[tuple[Bout, Path]],
+    video: VideoInfo,
+    ffmpeg_bin: str = "ffmpeg",
+) -> list[Path]:
+    """Write stream-copied clips that span the whole video as copies of the file.
+
+    Falls back to ffmpeg if the file cannot be copied.
+    """
+    def _copy(staged):
+        for _, tmp in staged:
+            shutil.copyfile(video.path, tmp)
+        return 0, ""
+
+    try:
+        _run_staged(clips, _copy)
+        return [output_path for _, output_path in clips]
+    except OSError as e:
+        warn(f"Could not copy {video.filename!r} ({e}) — falling back to ffmpeg.")
+        return extract_clips(clips, video, fast=True, ffmpeg_bin=ffmpeg_bin)
 
 
 def extract_clip(
@@ -67,6 +517,8 @@ def extract_clip(
     video: VideoInfo,
     output_path: Path,
     fast: bool = False,
+    encoder: str | None = None,
+    ffmpeg_bin: str = "ffmpeg",
 ) -> None:
     """Extract a single clip from a video using ffmpeg.
 
@@ -81,45 +533,19 @@ def extract_clip(
     fast:
         If ``True``, use stream-copy (fast but keyframe-imprecise).
         If ``False`` (default), re-encode for frame-accurate cuts.
+    encoder:
+        Optional hardware encoder used when re-encoding; see
+        :func:`extract_clips`.
+    ffmpeg_bin:
+        ffmpeg executable to run.
     """
-    duration = bout.stop - bout.start
+    extract_clips([(bout, output_path)], video, fast=fast, encoder=encoder, ffmpeg_bin=ffmpeg_bin)
 
-    if fast:
-        # Stream copy: seek before input for speed; cuts snap to nearest keyframe
-        cmd = [
-            "ffmpeg",
-            "-y",
-            "-ss", f"{bout.start:.6f}",
-            "-i", video.path,
-            "-t", f"{duration:.6f}",
-            "-c", "copy",
-            str(output_path),
-        ]
-    else:
-        # Re-encode: seek after input for frame accuracy
-        cmd = [
-            "ffmpeg",
-            "-y",
-            "-i", video.path,
-            "-ss", f"{bout.start:.6f}",
-            "-t", f"{duration:.6f}",
-            str(output_path),
-        ]
 
-    try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-        )
-    except FileNotFoundError:
-        abort("ffmpeg not found. Please ensure ffmpeg is installed and on your PATH.")
-
-    if result.returncode != 0:
-        warn(
-            f"ffmpeg returned non-zero exit code for {output_path.name!r}:\n"
-            f"{result.stderr[-500:].strip()}"
-        )
+def _batched(clips: list[tuple[Bout, Path]], jobs: int) -> list[list[tuple[Bout, Path]]]:
+    """Split planned clips into batches, spreading them over ``jobs`` workers."""
+    size = min(_MAX_BATCH_SIZE, max(1, -(-len(clips) // jobs)))
+    return [clips[i:i + size] for i in range(0, len(clips), size)]
 
 
 def _apply_max_clips(
@@ -133,17 +559,137 @@ def _apply_max_clips(
     """
     if max_clips is None:
         return bouts
-    counts: dict[tuple[str, str], int] = {}
+    counts: defaultdict[tuple[str, str], int] = defaultdict(int)
     kept: list[Bout] = []
     for bout in bouts:
         key = (bout.behaviour, bout.subject)
-        n = counts.get(key, 0)
-        if n < max_clips:
+        if counts[key] < max_clips:
             kept.append(bout)
-            counts[key] = n + 1
+            counts[key] += 1
     return kept
 
 
+def _padded_windows(
+    bouts: list[Bout],
+    video: VideoInfo,
+    padding_pre: float,
+    padding_post: float,
+    point_padding_pre: float,
+    point_padding_post: float,
+    max_duration: float | None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return padded start and stop times for all bouts at once.
+
+    Equivalent to :meth:`Bout.with_padding` followed by the ``max_duration``
+    truncation, but vectorised so long ethograms are not interpreter-bound.
+    """
+    n = len(bouts)
+    starts = np.fromiter((b.start for b in bouts), dtype=np.float64, count=n)
+    stops = np.fromiter((b.stop for b in bouts), dtype=np.float64, count=n)
+    is_point = np.fromiter((b.is_point for b in bouts), dtype=bool, count=n)
+
+    starts = np.maximum(starts - np.where(is_point, point_padding_pre, padding_pre), 0.0)
+    stops = np.minimum(stops + np.where(is_point, point_padding_post, padding_post), video.duration)
+
+    # Truncate from the end if the padded clip exceeds max_duration
+    if max_duration is not None:
+        stops = np.where(stops - starts > max_duration, starts + max_duration, stops)
+    return starts, stops
+
+
+# Snapping a start further back than this is reported, since the clip then
+# shows noticeably more than was asked for
+_SNAP_WARN_SECONDS = 0.5
+
+
+def _snap_to_keyframes(
+    starts: np.ndarray, copied: np.ndarray, keyframes: np.ndarray | None, video: VideoInfo
+) -> np.ndarray:
+    """Move the start of each stream-copied clip back to the keyframe at or before it.
+
+    ffmpeg does the same implicitly when stream copying, but only some players
+    honour the edit list that hides the extra frames; snapping up front makes
+    the clip, its recorded times and the frames shown agree. Stops are left
+    as they are, since a stream copy can end on any frame.
+    """
+    if keyframes is None:
+        return starts
+    index = np.searchsorted(keyframes, starts, side="right") - 1
+    snapped = np.where(copied & (index >= 0), keyframes[np.maximum(index, 0)], starts)
+    snapped = np.maximum(snapped, 0.0)
+
+    shifts = starts - snapped
+    far = int(np.count_nonzero(shifts > _SNAP_WARN_SECONDS))
+    if far:
+        warn(
+            f"{far} stream-copied clip(s) from {video.filename!r} start up to "
+            f"{shifts.max():.2f}s early because of sparse keyframes. "
+            "Re-encode them for exact boundaries."
+        )
+    return snapped
+
+
+# Records how each clip in an output directory was made, so re-runs can tell
+# an up-to-date clip from one cut with different padding or settings
+_MANIFEST_NAME = ".boris-clip.json"
+
+
+def _load_manifest(output_dir: Path) -> dict[str, str]:
+    """Return the manifest of *output_dir*, or an empty one if it is missing or invalid."""
+    try:
+        with open(output_dir / _MANIFEST_NAME, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def update_manifest(output_dir: Path, entries: dict[str, str]) -> None:
+    """Merge *entries* into the manifest, replacing it atomically.
+
+    Separate runs writing to one directory at once may drop each other's
+    entries, which only costs a rebuild on the next run, never a stale clip.
+    Callers running several extractions side by side should collect their
+    entries (see ``manifest_entries`` in :func:`extract_all_clips`) and write
+    them once.
+    """
+    manifest = _load_manifest(output_dir)
+    manifest.update(entries)
+    try:
+        fd, tmp = tempfile.mkstemp(dir=output_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=0, sort_keys=True)
+            os.replace(tmp, output_dir / _MANIFEST_NAME)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError as e:
+        warn(f"Could not update {_MANIFEST_NAME} in {str(output_dir)!r}: {e}")
+
+
+def _clip_signature(
+    video: VideoInfo, bout: Bout, fast: bool, encoder: str | None, copy_audio: bool
+) -> str:
+    """Describe everything that determines a clip's content."""
+    mode = "copy" if fast else encoder or "software"
+    audio = "acopy" if copy_audio and not fast else "aenc"
+    return f"{video.path}|{bout.start:.6f}|{bout.stop:.6f}|{mode}|{audio}"
+
+
+def available_cpus() -> int:
+    """Number of CPUs this process may run on (respects affinity masks)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def default_jobs() -> int:
+    """Default number of concurrent ffmpeg processes: half the CPU cores."""
+    return max(1, available_cpus() // 2)
+
+
 def extract_all_clips(
     bouts: list[Bout],
     video: VideoInfo,
@@ -156,6 +702,18 @@ def extract_all_clips(
     max_clips: int | None = None,
     fast: bool = False,
     progress_callback=None,
+    jobs: int | None = None,
+    encoder: str | None = None,
+    ffmpeg_bin: str = "ffmpeg",
+    force_rebuild: bool = False,
+    codec_threads: int | None = None,
+    fast_points: bool = False,
+    backend: str = "ffmpeg",
+    cpu_budget: int | None = None,
+    copy_audio: bool = True,
+    use_cache: bool = False,
+    manifest_entries: dict[str, str] | None = None,
+    ffprobe_bin: str = "ffprobe",
 ) -> list[Path]:
     """Extract clips for all bouts.
 
@@ -184,52 +742,250 @@ def extract_all_clips(
     fast:
         Use stream-copy instead of re-encoding.
     progress_callback:
-        Optional callable ``(current, total, output_path)`` for progress reporting.
+        Optional callable ``(current, total, output_path, cached)`` for
+        progress reporting. Called from the calling thread as each clip
+        finishes; ``cached`` is ``True`` for clips that were already up to date.
+    jobs:
+        Number of ffmpeg processes to run concurrently. Clips are split into
+        batches across them. Defaults to half the CPUs available to this process.
+    encoder:
+        Optional hardware encoder (a key of :data:`HW_ENCODERS`) used when
+        re-encoding. Ignored in fast mode.
+    ffmpeg_bin:
+        ffmpeg executable to run. Resolve it once (e.g. with
+        :func:`shutil.which`) so the ``PATH`` lookup is not repeated per run.
+    force_rebuild:
+        By default, a clip whose output file is newer than the video and was
+        made with the same times and settings (as recorded in the output
+        directory's ``.boris-clip.json``) is kept as is. Set to ``True`` to
+        extract every clip again.
+    codec_threads:
+        Threads per software decoder and encoder. Defaults to sharing the
+        available CPUs evenly between all clips being encoded at once.
+    fast_points:
+        Stream-copy point-event clips even when ``fast`` is ``False``. Point
+        clips are mostly for review, so snapping their padded window to
+        keyframes is usually acceptable and saves re-encoding them.
+    backend:
+        ``"ffmpeg"`` (default) or ``"pyav"``. With ``"pyav"``, stream-copied
+        clips are cut in-process by :mod:`boris_clip.pyav_backend` instead of
+        by ffmpeg processes; re-encoded clips always use ffmpeg.
+    cpu_budget:
+        Number of CPUs the default ``codec_threads`` are shared out of.
+        Defaults to all CPUs available to this process; lower it when other
+        extractions run alongside.
+    copy_audio:
+        When re-encoding clips one by one, copy their audio instead of
+        re-encoding it (see :func:`extract_clips`). Clips cut from a shared
+        decode always re-encode audio, since it passes through a filter.
+    use_cache:
+        Reuse the keyframe times of the video from the on-disk cache (see
+        :func:`~boris_clip.probe.probe_keyframes`) when stream copying.
+    manifest_entries:
+        If given, the manifest entries of the clips written are added to this
+        dict instead of being merged into ``output_dir``'s manifest, which is
+        then left for the caller to write with :func:`update_manifest`.
+    ffprobe_bin:
+        ffprobe executable used to look up keyframes, resolved once like
+        ``ffmpeg_bin``.
 
     Returns
     -------
     list[Path]
-        Paths to all successfully created clips.
+        Paths to all successfully created clips, including those already up
+        to date, in bout order.
     """
     output_dir.mkdir(parents=True, exist_ok=True)
 
     bouts = _apply_max_clips(bouts, max_clips)
-    created: list[Path] = []
-
-    for i, bout in enumerate(bouts):
-        pre = point_padding_pre if bout.is_point else padding_pre
-        post = point_padding_post if bout.is_point else padding_post
-        padded = bout.with_padding(pre=pre, post=post, video_duration=video.duration)
-
-        # Truncate from the end if the padded clip exceeds max_duration
-        if max_duration is not None and padded.duration > max_duration:
-            padded = Bout(
-                subject=padded.subject,
-                behaviour=padded.behaviour,
-                start=padded.start,
-                stop=padded.start + max_duration,
-                is_point=padded.is_point,
-            )
-
-        if padded.duration <= 0:
+    if jobs is None:
+        jobs = default_jobs()
+
+    # Plan every clip up front so the ffmpeg calls can be dispatched together
+    starts, stops = _padded_windows(
+        bouts, video, padding_pre, padding_post, point_padding_pre, point_padding_post,
+        max_duration,
+    )
+    copy_mask = np.fromiter(
+        (fast or (fast_points and b.is_point) for b in bouts), dtype=bool, count=len(bouts)
+    )
+    if copy_mask.any():
+        # Only the keyframes just before each stream-copied clip are read
+        keyframes = probe_keyframes(
+            video.path, use_cache, starts=starts[copy_mask], ffprobe_bin=ffprobe_bin
+        )
+        starts = _snap_to_keyframes(starts, copy_mask, keyframes, video)
+        if max_duration is not None:
+            # Snapping lengthens clips, so apply the cap again
+            stops = np.minimum(stops, starts + max_duration)
+    video_stem = Path(video.filename).stem
+    planned: list[tuple[Bout, Path]] = []
+    # Clips shorter than a frame would come out empty, so ffmpeg is not run
+    frame = 1.0 / video.fps if video.fps > 0 else 0.0
+    for bout, start, stop in zip(bouts, starts.tolist(), stops.tolist()):
+        if stop <= start or stop - start < frame:
             warn(
                 f"Bout ({bout.subject!r}, {bout.behaviour!r}) at t={bout.start:.3f}s "
-                "has zero or negative duration after padding — skipping."
+                "is shorter than one frame after padding — skipping."
             )
             continue
 
-        out_path = build_output_path(
-            bout=padded,
-            video=video,
-            output_dir=output_dir,
-            original_start=bout.start,
-            original_stop=bout.stop,
+        padded = Bout(
+            subject=bout.subject,
+            behaviour=bout.behaviour,
+            start=start,
+            stop=stop,
+            is_point=bout.is_point,
         )
 
+        out_path = output_dir / _clip_filename(
+            video_stem, _sanitise_name(bout.behaviour), _subject_component(bout),
+            bout.start, bout.stop,
+        )
+        planned.append((padded, out_path))
+
+    if not planned:
+        return []
+
+    # Keep clips from earlier runs that are still up to date
+    def _copied(bout: Bout) -> bool:
+        return fast or (fast_points and bout.is_point)
+
+    signatures = {
+        out_path: _clip_signature(video, padded, _copied(padded), encoder, copy_audio)
+        for padded, out_path in planned
+    }
+    cached: list[Path] = []
+    pending = planned
+    if not force_rebuild:
+        cached, pending = _split_up_to_date(planned, signatures, video, output_dir)
+
+    # When re-encoding, overlapping clips (and dense runs of nearby ones) are
+    # cut from one shared decode of their union; everything else is batched
+    # as usual
+    copied = [clip for clip in pending if _copied(clip[0])]
+    # A stream copy spanning the whole source is the source file itself
+    whole: list[tuple[Bout, Path]] = []
+    if Path(video.path).suffix.lower() == ".mp4":
+        whole = [clip for clip in copied if _spans_video(clip[0], video)]
+        copied = [clip for clip in copied if not _spans_video(clip[0], video)]
+    singles: list[tuple[Bout, Path]] = []
+    merged: list[list[tuple[Bout, Path]]] = []
+    if not fast:
+        for group in _decode_groups([clip for clip in pending if not _copied(clip[0])]):
+            for i in range(0, len(group), _MAX_BATCH_SIZE):
+                chunk = group[i:i + _MAX_BATCH_SIZE]
+                if len(chunk) > 1:
+                    merged.append(chunk)
+                else:
+                    singles.extend(chunk)
+
+    # ffmpeg runs out of process, so threads are enough to keep several busy
+    jobs = max(1, jobs)
+    done = 0
+    for out_path in cached:
+        done += 1
         if progress_callback is not None:
-            progress_callback(i + 1, len(bouts), out_path)
-
-        extract_clip(bout=padded, video=video, output_path=out_path, fast=fast)
-        created.append(out_path)
-
-    return created
\ No newline at end of file
+            progress_callback(done, len(planned), out_path, cached=True)
+
+    if not pending:
+        return cached
+
+    batches = [(batch, True) for batch in _batched(copied, jobs)]
+    batches += [(batch, False) for batch in _batched(singles, jobs)]
+
+    # Share the CPUs between every encoder running at once rather than
+    # letting each one start a thread per core
+    workers = min(jobs, len(batches) + len(merged)) or 1
+    cpus = cpu_budget if cpu_budget is not None else available_cpus()
+
+    def _threads(clips: list[tuple[Bout, Path]]) -> int:
+        if codec_threads is not None:
+            return codec_threads
+        return max(1, cpus // (workers * len(clips)))
+
+    written: dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {}
+        for batch, batch_fast in batches:
+            if batch_fast and backend == "pyav":
+                future = pool.submit(
+                    _copy_with_pyav, clips=batch, video=video, ffmpeg_bin=ffmpeg_bin
+                )
+            else:
+                future = pool.submit(
+                    extract_clips, clips=batch, video=video, fast=batch_fast,
+                    encoder=encoder, ffmpeg_bin=ffmpeg_bin, threads=_threads(batch),
+                    copy_audio=copy_audio,
+                )
+            futures[future] = batch
+        if whole:
+            future = pool.submit(_copy_source, clips=whole, video=video, ffmpeg_bin=ffmpeg_bin)
+            futures[future] = whole
+        for group in merged:
+            future = pool.submit(
+                _extract_merged, clips=group, video=video, encoder=encoder,
+                ffmpeg_bin=ffmpeg_bin, threads=_threads(group),
+            )
+            futures[future] = group
+        for future in as_completed(futures):
+            for out_path in future.result():
+                written[out_path.name] = signatures[out_path]
+            for _, out_path in futures[future]:
+                done += 1
+                if progress_callback is not None:
+                    progress_callback(done, len(planned), out_path, cached=False)
+
+    if manifest_entries is not None:
+        manifest_entries.update(written)
+    elif written:
+        update_manifest(output_dir, written)
+    up_to_date = set(cached)
+    return [
+        out_path for _, out_path in planned
+        if out_path in up_to_date or out_path.name in written
+    ]
+
+
+def _decode_groups(clips: list[tuple[Bout, Path]]) -> list[list[tuple[Bout, Path]]]:
+    """Group clips that should share one decode: overlapping or dense runs."""
+    groups: list[list[tuple[Bout, Path]]] = []
+    for run in _merge_overlapping(clips, max_gap=_DENSE_GAP):
+        if len(run) > _DENSE_GROUP_SIZE:
+            groups.append(run)
+        else:
+            groups.extend(_merge_overlapping(run))
+    return groups
+
+
+def _split_up_to_date(
+    planned: list[tuple[Bout, Path]],
+    signatures: dict[Path, str],
+    video: VideoInfo,
+    output_dir: Path,
+) -> tuple[list[Path], list[tuple[Bout, Path]]]:
+    """Split planned clips into up-to-date output paths and clips to extract."""
+    manifest = _load_manifest(output_dir)
+    if not manifest:
+        return [], planned
+    try:
+        video_mtime = os.stat(video.path).st_mtime_ns
+    except OSError:
+        return [], planned
+
+    cached: list[Path] = []
+    pending: list[tuple[Bout, Path]] = []
+    for clip in planned:
+        out_path = clip[1]
+        if manifest.get(out_path.name) == signatures[out_path]:
+            try:
+                stat = out_path.stat()
+            except OSError:
+                pass
+            else:
+                # An empty file can only be left from a clip that failed
+                if stat.st_size > 0 and stat.st_mtime_ns > video_mtime:
+                    cached.append(out_path)
+                    continue
+        pending.append(clip)
+    return cached, pending
@@ -3,7 +3,7 @@
 from dataclasses import dataclass, field
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class VideoInfo:
     """Metadata extracted from a video file via ffprobe."""
 
@@ -11,9 +11,15 @@ class VideoInfo:
     filename: str
     duration: float  # seconds
     fps: float
+    has_audio: bool = True
 
 
-@dataclass
+# Subject labels BORIS uses when no focal subject was selected, normalised
+# with str.strip().lower()
+NO_FOCAL_SUBJECT_LABELS = frozenset({"", "no focal subject", "no-focal-subject"})
+
+
+@dataclass(frozen=True, slots=True)
 class Bout:
     """A single annotated behavioural bout."""
 
@@ -22,6 +28,15 @@ class Bout:
     start: float  # seconds
     stop: float  # seconds
     is_point: bool = False
+    # Derived from subject once, at construction
+    is_no_focal_subject: bool = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # Bouts are frozen, so the derived field is set around __setattr__
+        object.__setattr__(
+            self, "is_no_focal_subject",
+            self.subject.strip().lower() in NO_FOCAL_SUBJECT_LABELS,
+        )
 
     @property
     def duration(self) -> float:
@@ -47,7 +62,7 @@ class Bout:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class ParsedAnnotations:
     """Result of parsing a BORIS file."""
 
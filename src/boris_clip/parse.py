@@ -8,15 +8,35 @@ Supports:
 All formats are normalised into a list of Bout objects.
 """
 
+from __future__ import annotations
+
 import json
+import mmap
+import operator
+import os
+import re
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import pandas as pd
+import numpy as np
 
-from .cli_utils import abort, warn
+from . import cache
+from .cli_utils import abort, recording_warnings, warn
 
 from .models import Bout, ParsedAnnotations
 
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas takes a good part of a second to import and is only needed for CSV
+# exports, so the functions handling them import it themselves; .boris
+# projects and cached results never load it
+
+try:
+    import orjson  # optional, several times faster on large project files
+except ImportError:  # pragma: no cover - exercised only without orjson
+    orjson = None
+
 
 # ---------------------------------------------------------------------------
 # Format detection
@@ -49,9 +69,31 @@ def _detect_csv_format(df: pd.DataFrame) -> str:
 
 def _sanitise_str(value) -> str:
     """Strip and normalise a string value from a BORIS file."""
+    import pandas as pd
+
     return str(value).strip() if pd.notna(value) else ""
 
 
+def _sanitise_column(values: pd.Series) -> pd.Series:
+    """Apply :func:`_sanitise_str` to a whole column at once."""
+    return values.astype(str).str.strip().where(values.notna(), "")
+
+
+def _constant_number(values: pd.Series) -> float | None:
+    """Return the value of a numeric column that is the same in every row.
+
+    Missing and non-numeric entries are ignored; returns ``None`` if no
+    value or more than one value is found.
+    """
+    import pandas as pd
+
+    numbers = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+    numbers = numbers[~np.isnan(numbers)]
+    if numbers.size and (numbers == numbers[0]).all():
+        return float(numbers[0])
+    return None
+
+
 def _find_col(df: pd.DataFrame, candidates: list[str]) -> str | None:
     """Return the first column name (case-insensitive) matching any candidate."""
     lower_map = {c.lower(): c for c in df.columns}
@@ -75,6 +117,8 @@ def _require_col(df: pd.DataFrame, candidates: list[str], label: str) -> str:
 
 def _parse_tabular_csv(df: pd.DataFrame, path: Path) -> ParsedAnnotations:
     """Parse a BORIS tabular events export."""
+    import pandas as pd
+
     col_time = _require_col(df, ["Time"], "Time")
     col_subject = _require_col(df, ["Subject"], "Subject")
     col_behaviour = _require_col(df, ["Behavior", "Behaviour"], "Behavior")
@@ -98,31 +142,30 @@ def _parse_tabular_csv(df: pd.DataFrame, path: Path) -> ParsedAnnotations:
 
     col_fps = _find_col(df, ["FPS", "Fps"])
     if col_fps is not None:
-        fps_vals = pd.to_numeric(df[col_fps], errors="coerce").dropna().unique()
-        if len(fps_vals) == 1:
-            fps = float(fps_vals[0])
+        fps = _constant_number(df[col_fps])
 
     col_duration = _find_col(df, ["Total length", "Duration"])
     if col_duration is not None:
-        dur_vals = pd.to_numeric(df[col_duration], errors="coerce").dropna().unique()
-        if len(dur_vals) == 1:
-            duration = float(dur_vals[0])
+        duration = _constant_number(df[col_duration])
 
-    # Sort by time to ensure correct START/STOP pairing
-    df = df.copy()
-    df[col_time] = pd.to_numeric(df[col_time], errors="coerce")
-    df = df.dropna(subset=[col_time]).sort_values(col_time)
+    # Sort by time to ensure correct START/STOP pairing; rows are reordered
+    # through an index rather than a sorted copy of the whole frame
+    times_all = pd.to_numeric(df[col_time], errors="coerce").to_numpy(dtype=float)
+    order = np.flatnonzero(~np.isnan(times_all))
+    order = order[np.argsort(times_all[order], kind="stable")]
 
     bouts: list[Bout] = []
     # Track open state events: (subject, behaviour) -> start_time
     open_states: dict[tuple[str, str], float] = {}
 
-    for _, row in df.iterrows():
-        t = float(row[col_time])
-        subject = _sanitise_str(row[col_subject])
-        behaviour = _sanitise_str(row[col_behaviour])
-        status = _sanitise_str(row[col_status]).upper()
+    # The pairing needs a Python loop, but the columns are converted up front
+    # so the loop does not build a Series per row
+    times = times_all[order].tolist()
+    subjects = _sanitise_column(df[col_subject].iloc[order]).tolist()
+    behaviours = _sanitise_column(df[col_behaviour].iloc[order]).tolist()
+    statuses = _sanitise_column(df[col_status].iloc[order]).str.upper().tolist()
 
+    for t, subject, behaviour, status in zip(times, subjects, behaviours, statuses):
         if status in ("START",):
             key = (subject, behaviour)
             if key in open_states:
@@ -185,6 +228,8 @@ def _parse_tabular_csv(df: pd.DataFrame, path: Path) -> ParsedAnnotations:
 
 def _parse_aggregated_csv(df: pd.DataFrame, path: Path) -> ParsedAnnotations:
     """Parse a BORIS aggregated events export."""
+    import pandas as pd
+
     col_subject = _require_col(df, ["Subject"], "Subject")
     col_behaviour = _require_col(df, ["Behavior", "Behaviour"], "Behavior")
     col_start = _require_col(df, ["Start (s)", "Start(s)"], "Start (s)")
@@ -196,45 +241,39 @@ def _parse_aggregated_csv(df: pd.DataFrame, path: Path) -> ParsedAnnotations:
     duration: float | None = None
 
     if col_media is not None:
-        filenames = df[col_media].dropna().unique()
-        if len(filenames) >= 1:
-            media_filename = Path(_sanitise_str(filenames[0])).name
+        first = df[col_media].first_valid_index()
+        if first is not None:
+            media_filename = Path(_sanitise_str(df[col_media].loc[first])).name
 
     col_fps = _find_col(df, ["FPS", "Fps"])
     if col_fps is not None:
-        fps_vals = pd.to_numeric(df[col_fps], errors="coerce").dropna().unique()
-        if len(fps_vals) == 1:
-            fps = float(fps_vals[0])
+        fps = _constant_number(df[col_fps])
 
     col_total = _find_col(df, ["Total length", "Duration"])
     if col_total is not None:
-        dur_vals = pd.to_numeric(df[col_total], errors="coerce").dropna().unique()
-        if len(dur_vals) == 1:
-            duration = float(dur_vals[0])
-
-    bouts: list[Bout] = []
-    for _, row in df.iterrows():
-        subject = _sanitise_str(row[col_subject])
-        behaviour = _sanitise_str(row[col_behaviour])
-        start = pd.to_numeric(row[col_start], errors="coerce")
-        stop = pd.to_numeric(row[col_stop], errors="coerce")
-
-        if pd.isna(start) or pd.isna(stop):
-            warn(f"Skipping row with missing start/stop for ({subject!r}, {behaviour!r}).")
-            continue
-
-        start, stop = float(start), float(stop)
-        is_point = start == stop
+        duration = _constant_number(df[col_total])
+
+    # Whole columns are converted at once rather than row by row
+    subjects = _sanitise_column(df[col_subject]).to_numpy()
+    behaviours = _sanitise_column(df[col_behaviour]).to_numpy()
+    starts = pd.to_numeric(df[col_start], errors="coerce").to_numpy(dtype=float)
+    stops = pd.to_numeric(df[col_stop], errors="coerce").to_numpy(dtype=float)
+
+    valid = ~(np.isnan(starts) | np.isnan(stops))
+    n_invalid = len(valid) - int(valid.sum())
+    if n_invalid:
+        first = int(np.argmin(valid))
+        warn(
+            f"Skipping {n_invalid} row(s) with missing start/stop, the first for "
+            f"({subjects[first]!r}, {behaviours[first]!r})."
+        )
 
-        bouts.append(
-            Bout(
-                subject=subject,
-                behaviour=behaviour,
-                start=start,
-                stop=stop,
-                is_point=is_point,
-            )
+    bouts = [
+        Bout(subject=subject, behaviour=behaviour, start=start, stop=stop, is_point=start == stop)
+        for subject, behaviour, start, stop in zip(
+            subjects[valid], behaviours[valid], starts[valid].tolist(), stops[valid].tolist()
         )
+    ]
 
     return ParsedAnnotations(
         bouts=bouts,
@@ -251,22 +290,27 @@ def _parse_aggregated_csv(df: pd.DataFrame, path: Path) -> ParsedAnnotations:
 
 def _parse_obs_events(
     events: list,
-    ethogram: dict[str, str],
+    point_behaviours: set[str],
     obs_id: str,
 ) -> list[Bout]:
-    """Parse raw BORIS events for a single observation into Bouts."""
+    """Parse raw BORIS events for a single observation into Bouts.
+
+    Behaviours in ``point_behaviours`` are point events; all others,
+    including behaviours missing from the ethogram, are state events.
+    """
     bouts: list[Bout] = []
     open_states: dict[tuple[str, str], float] = {}
 
-    for event in sorted(events, key=lambda e: e[0]):
-        if len(event) < 3:
-            continue
-        t = float(event[0])
-        subject = str(event[1]).strip()
-        behaviour = str(event[2]).strip()
-        event_type = ethogram.get(behaviour, "State event")
+    # Decode each event once, then sort the decoded tuples by time
+    decoded = [
+        (float(event[0]), str(event[1]).strip(), str(event[2]).strip())
+        for event in events
+        if len(event) >= 3
+    ]
+    decoded.sort(key=operator.itemgetter(0))
 
-        if "point" in event_type.lower():
+    for t, subject, behaviour in decoded:
+        if behaviour in point_behaviours:
             bouts.append(Bout(subject=subject, behaviour=behaviour, start=t, stop=t, is_point=True))
         else:
             key = (subject, behaviour)
@@ -305,34 +349,61 @@ def _extract_obs_media(obs: dict) -> tuple[str | None, str | None]:
 def _extract_obs_media_info(obs: dict) -> tuple[float | None, float | None]:
     """Return (fps, duration) from a single observation's media_info."""
     media_info = obs.get("media_info", {})
-    fps: float | None = None
-    duration: float | None = None
     if not isinstance(media_info, dict):
-        return fps, duration
-    for v in media_info.get("fps", {}).values():
-        try:
-            fps = float(v); break
-        except (ValueError, TypeError):
-            pass
-    for v in media_info.get("length", media_info.get("duration", {})).values():
+        return None, None
+    fps = _first_float(media_info.get("fps"))
+    duration = _first_float(media_info.get("length", media_info.get("duration")))
+    return fps, duration
+
+
+def _first_float(values) -> float | None:
+    """Return the first value of a per-player dict that converts to float."""
+    if not isinstance(values, dict):
+        return None
+    for v in values.values():
         try:
-            duration = float(v); break
+            return float(v)
         except (ValueError, TypeError):
-            pass
-    return fps, duration
+            continue
+    return None
 
 
 def _parse_boris_project(path: Path) -> list[ParsedAnnotations]:
     """Parse a BORIS .boris project file into one ParsedAnnotations per observation."""
+    return _parse_boris_dict(_load_project(path))
+
+
+def _load_project(path: Path) -> dict:
+    """Decode a .boris project file, with orjson when it is installed."""
+    # An empty file cannot be mapped; json reports it as invalid instead
+    if orjson is not None and os.path.getsize(path) > 0:
+        # orjson decodes straight from the mapped file, without first
+        # copying it into a bytes object
+        with (
+            open(path, "rb") as fh,
+            mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+            memoryview(mapped) as data,
+        ):
+            try:
+                return orjson.loads(data)
+            except orjson.JSONDecodeError:
+                # orjson rejects the NaN and Infinity literals Python's json
+                # writes for missing values; the stdlib decoder accepts them
+                pass
     with open(path, encoding="utf-8") as fh:
-        project = json.load(fh)
+        return json.load(fh)
+
 
+def _parse_boris_dict(project: dict) -> list[ParsedAnnotations]:
+    """Parse the decoded contents of a .boris project file."""
     ethogram: dict[str, str] = {}
     for entry in project.get("behaviors_conf", project.get("ethogram", {})).values():
         code = entry.get("code", entry.get("name", "")).strip()
         btype = entry.get("type", "").strip()
         if code:
             ethogram[code] = btype
+    # Classify each behaviour once rather than once per event
+    point_behaviours = {code for code, btype in ethogram.items() if "point" in btype.lower()}
 
     observations = project.get("observations", {})
     if not observations:
@@ -342,7 +413,7 @@ def _parse_boris_project(path: Path) -> list[ParsedAnnotations]:
     for obs_id, obs in observations.items():
         media_filename, media_path = _extract_obs_media(obs)
         fps, duration = _extract_obs_media_info(obs)
-        bouts = _parse_obs_events(obs.get("events", []), ethogram, obs_id)
+        bouts = _parse_obs_events(obs.get("events", []), point_behaviours, obs_id)
         results.append(ParsedAnnotations(
             bouts=bouts,
             obs_id=obs_id,
@@ -359,26 +430,44 @@ def _parse_boris_project(path: Path) -> list[ParsedAnnotations]:
 # Public entry point
 # ---------------------------------------------------------------------------
 
+# Every column either CSV parser looks at (lower case); BORIS exports carry
+# many more, such as modifiers and comments, which are never loaded
+_CSV_COLUMNS = frozenset({
+    "time", "subject", "behavior", "behaviour", "status", "behavior type", "behaviour type",
+    "start (s)", "start(s)", "stop (s)", "stop(s)",
+    "media file path", "media file name", "media file", "fps", "total length", "duration",
+})
+
+
+# Column names that mark the header line of a BORIS CSV
+_HEADER_NAMES = re.compile(r"time|subject|behaviou?r|start \(s\)", re.IGNORECASE)
+
+
 def _read_csv_skip_header(path: Path) -> pd.DataFrame:
-    """Read a BORIS CSV, skipping any non-tabular header lines."""
+    """Read the columns of a BORIS CSV we use, skipping any non-tabular header lines."""
+    import pandas as pd
+
     # BORIS sometimes prepends metadata lines before the actual header.
     # We find the first line that looks like a real header by searching for
-    # known column names.
-    known_headers = {"time", "subject", "behavior", "behaviour", "start (s)"}
-    with open(path, encoding="utf-8-sig") as fh:
-        lines = fh.readlines()
-
+    # known column names. Only the lines up to the header are read here;
+    # pandas parses the rest
     skip = 0
-    for i, line in enumerate(lines):
-        lower = line.lower()
-        if any(h in lower for h in known_headers):
-            skip = i
-            break
-
-    return pd.read_csv(path, skiprows=skip, encoding="utf-8-sig")
+    with open(path, encoding="utf-8-sig") as fh:
+        for i, line in enumerate(fh):
+            if _HEADER_NAMES.search(line):
+                skip = i
+                break
+
+    return pd.read_csv(
+        path,
+        skiprows=skip,
+        usecols=lambda col: col.strip().lower() in _CSV_COLUMNS,
+        encoding="utf-8-sig",
+        engine="c",
+    )
 
 
-def parse_boris_file(path: str) -> list[ParsedAnnotations]:
+def parse_boris_file(path: str, use_cache: bool = False) -> list[ParsedAnnotations]:
     """Parse a BORIS annotation file in any supported format.
 
     Supported formats are detected automatically:
@@ -394,6 +483,10 @@ def parse_boris_file(path: str) -> list[ParsedAnnotations]:
     ----------
     path:
         Path to the BORIS file.
+    use_cache:
+        If ``True``, reuse the result of an earlier parse of the same file
+        from the on-disk cache (see :mod:`boris_clip.cache`), replaying any
+        warnings it emitted, and store the result on a miss.
 
     Returns
     -------
@@ -404,6 +497,25 @@ def parse_boris_file(path: str) -> list[ParsedAnnotations]:
     if not p.exists():
         abort(f"BORIS file not found: {path!r}")
 
+    if not use_cache:
+        return _parse_file(p, path)
+
+    key = cache.file_key(p, "parse")
+    hit = cache.load(key)
+    if hit is not None:
+        warnings, observations = hit
+        for message in warnings:
+            warn(message)
+        return observations
+
+    with recording_warnings() as warnings:
+        observations = _parse_file(p, path)
+    cache.store(key, (warnings, observations))
+    return observations
+
+
+def _parse_file(p: Path, path: str) -> list[ParsedAnnotations]:
+    """Parse an existing BORIS file; see :func:`parse_boris_file`."""
     if _is_boris_project(p):
         return _parse_boris_project(p)
 
@@ -416,4 +528,4 @@ def parse_boris_file(path: str) -> list[ParsedAnnotations]:
     if fmt in ("tabular", "tabular_legacy"):
         return [_parse_tabular_csv(df, p)]
     else:
-        return [_parse_aggregated_csv(df, p)]
\ No newline at end of file
+        return [_parse_aggregated_csv(df, p)]
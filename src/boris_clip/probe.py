@@ -1,19 +1,24 @@
 """ffprobe wrapper for extracting video metadata."""
 
+import functools
 import json
 import os
 import subprocess
+from dataclasses import replace
 from pathlib import Path
 
-from .cli_utils import abort, warn
+import numpy as np
+
+from . import cache
+from .cli_utils import abort, recording_warnings, warn
 
 from .models import VideoInfo
 
 
-def _run_ffprobe(video_path: str) -> dict:
+def _run_ffprobe(video_path: str, ffprobe_bin: str = "ffprobe") -> dict:
     """Run ffprobe on a video file and return parsed JSON output."""
     cmd = [
-        "ffprobe",
+        ffprobe_bin,
         "-v", "quiet",
         "-print_format", "json",
         "-show_streams",
@@ -33,20 +38,72 @@ def _run_ffprobe(video_path: str) -> dict:
         abort(f"Could not parse ffprobe output for {video_path!r}.")
 
 
-def probe_video(video_path: str) -> VideoInfo:
+def probe_video(
+    video_path: str, use_cache: bool = False, ffprobe_bin: str = "ffprobe"
+) -> VideoInfo:
     """Extract metadata from a video file using ffprobe.
 
+    Results are cached per resolved path, modification time and size, so
+    observations sharing a video only probe it once and edited files are
+    probed again.
+
     Parameters
     ----------
     video_path:
         Path to the video file.
+    use_cache:
+        If ``True``, also reuse the result of an earlier run from the
+        on-disk cache (see :mod:`boris_clip.cache`), replaying any warnings
+        it emitted, and store the result on a miss.
+    ffprobe_bin:
+        ffprobe executable to run. Resolve it once (e.g. with
+        :func:`shutil.which`) so the ``PATH`` lookup is not repeated per call.
 
     Returns
     -------
     VideoInfo
         Parsed metadata including duration, fps, and filename.
     """
-    data = _run_ffprobe(video_path)
+    try:
+        stat = os.stat(video_path)
+    except OSError:
+        # Let ffprobe report the problem as usual
+        return _probe_video(video_path, ffprobe_bin)
+    info = _probe_video_cached(
+        str(Path(video_path).resolve()), stat.st_mtime_ns, stat.st_size, use_cache, ffprobe_bin
+    )
+    # The cached entry may have been probed under another name for the same file
+    return replace(info, path=os.path.abspath(video_path), filename=Path(video_path).name)
+
+
+@functools.lru_cache(maxsize=None)
+def _probe_video_cached(
+    resolved_path: str,
+    mtime_ns: int,
+    size: int,
+    use_cache: bool = False,
+    ffprobe_bin: str = "ffprobe",
+) -> VideoInfo:
+    """Probe *resolved_path*; the stat fields only serve as cache key."""
+    if not use_cache:
+        return _probe_video(resolved_path, ffprobe_bin)
+
+    key = cache.file_key(Path(resolved_path), "probe")
+    hit = cache.load(key)
+    if hit is not None:
+        warnings, info = hit
+        for message in warnings:
+            warn(message)
+        return info
+
+    with recording_warnings() as warnings:
+        info = _probe_video(resolved_path, ffprobe_bin)
+    cache.store(key, (warnings, info))
+    return info
+
+
+def _probe_video(video_path: str, ffprobe_bin: str = "ffprobe") -> VideoInfo:
+    data = _run_ffprobe(video_path, ffprobe_bin)
 
     # Duration: prefer format-level, fall back to video stream
     duration: float | None = None
@@ -56,6 +113,8 @@ def probe_video(video_path: str) -> VideoInfo:
         except (ValueError, TypeError):
             pass
 
+    has_audio = any(s.get("codec_type") == "audio" for s in data.get("streams", []))
+
     fps: float | None = None
     for stream in data.get("streams", []):
         if stream.get("codec_type") == "video":
@@ -83,4 +142,155 @@ def probe_video(video_path: str) -> VideoInfo:
         filename=Path(video_path).name,
         duration=duration,
         fps=fps,
+        has_audio=has_audio,
     )
+
+
+# With clip starts given, keyframes are read from this many seconds before
+# each start, so the keyframe it snaps back to is included, to this far after
+# it, since packets arrive in decode order rather than by timestamp
+_KEYFRAME_LOOKBACK = 5.0
+_KEYFRAME_LOOKAHEAD = 1.0
+
+
+def probe_keyframes(
+    video_path: str,
+    use_cache: bool = False,
+    starts: np.ndarray | None = None,
+    ffprobe_bin: str = "ffprobe",
+) -> np.ndarray | None:
+    """Return the keyframe times of a video, in seconds from its start.
+
+    Only packet headers are read. Without ``starts`` that still means reading
+    through the whole file, so pass the clip starts the keyframes are needed
+    for. Results are cached like :func:`probe_video`. Returns ``None`` if the
+    keyframes cannot be determined, in which case callers should carry on
+    without them.
+
+    Parameters
+    ----------
+    video_path:
+        Path to the video file.
+    use_cache:
+        If ``True``, also reuse the result of an earlier run from the
+        on-disk cache and store the result on a miss.
+    starts:
+        Optional clip start times, in seconds from the start of the file. If
+        given, only the few seconds around each are read, and keyframes
+        elsewhere may be missing from the result.
+    ffprobe_bin:
+        ffprobe executable to run, as for :func:`probe_video`.
+
+    Returns
+    -------
+    numpy.ndarray or None
+        Sorted, read-only array of keyframe times.
+    """
+    try:
+        stat = os.stat(video_path)
+    except OSError:
+        return None
+    windows = None if starts is None else _keyframe_windows(starts)
+    return _probe_keyframes_cached(
+        str(Path(video_path).resolve()), stat.st_mtime_ns, stat.st_size, use_cache, windows,
+        ffprobe_bin,
+    )
+
+
+def _keyframe_windows(starts: np.ndarray) -> tuple[tuple[float, float], ...]:
+    """Return the sorted, disjoint ``(start, end)`` windows to read keyframes from."""
+    windows: list[tuple[float, float]] = []
+    for start in np.sort(np.asarray(starts, dtype=float)).tolist():
+        lo = round(max(0.0, start - _KEYFRAME_LOOKBACK), 6)
+        hi = round(start + _KEYFRAME_LOOKAHEAD, 6)
+        if windows and lo <= windows[-1][1]:
+            windows[-1] = (windows[-1][0], hi)
+        else:
+            windows.append((lo, hi))
+    return tuple(windows)
+
+
+@functools.lru_cache(maxsize=16)
+def _probe_keyframes_cached(
+    resolved_path: str,
+    mtime_ns: int,
+    size: int,
+    use_cache: bool = False,
+    windows: tuple[tuple[float, float], ...] | None = None,
+    ffprobe_bin: str = "ffprobe",
+) -> np.ndarray | None:
+    """Probe keyframes of *resolved_path*; the stat fields only serve as cache key."""
+    if not use_cache:
+        return _probe_keyframes(resolved_path, windows, ffprobe_bin)
+
+    key = cache.file_key(Path(resolved_path), f"keyframes {windows}")
+    keyframes = cache.load(key)
+    if keyframes is None:
+        keyframes = _probe_keyframes(resolved_path, windows, ffprobe_bin)
+        if keyframes is not None:  # failures are not cached
+            cache.store(key, keyframes)
+    else:
+        keyframes.flags.writeable = False
+    return keyframes
+
+
+def _run_ffprobe_csv(args: list[str], video_path: str, ffprobe_bin: str) -> str | None:
+    """Run ffprobe with CSV output, returning ``None`` if it fails."""
+    cmd = [ffprobe_bin, "-v", "error", *args, "-of", "csv=p=0", video_path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    except (FileNotFoundError, subprocess.CalledProcessError):
+        return None
+    return result.stdout
+
+
+def _probe_keyframes(
+    video_path: str,
+    windows: tuple[tuple[float, float], ...] | None = None,
+    ffprobe_bin: str = "ffprobe",
+) -> np.ndarray | None:
+    args = ["-select_streams", "v:0"]
+    if windows is not None:
+        # -read_intervals takes timestamps as stored in the file, so the
+        # windows are shifted by its start time first
+        header = _run_ffprobe_csv(
+            ["-show_entries", "format=start_time"], video_path, ffprobe_bin
+        )
+        if header is None:
+            return None
+        try:
+            offset = float(header.strip())
+        except ValueError:
+            offset = 0.0  # N/A
+        args += [
+            "-read_intervals",
+            ",".join(f"{lo + offset:.6f}%{hi + offset:.6f}" for lo, hi in windows),
+        ]
+    output = _run_ffprobe_csv(
+        args + ["-show_entries", "packet=pts_time,flags:format=start_time"], video_path,
+        ffprobe_bin,
+    )
+    if output is None:
+        return None
+
+    # Packet lines are "pts_time,flags" (keyframes have a K flag); the
+    # format section follows as a single "start_time" field
+    times: list[float] = []
+    start_time = 0.0
+    for line in output.splitlines():
+        fields = line.strip().split(",")
+        try:
+            if len(fields) >= 2:
+                if "K" in fields[1]:
+                    times.append(float(fields[0]))
+            elif fields[0]:
+                start_time = float(fields[0])
+        except ValueError:
+            continue  # N/A timestamps
+    if not times:
+        return None
+
+    # Seek times are relative to the start of the file, as for ffmpeg's -ss
+    keyframes = np.sort(np.array(times)) - start_time
+    keyframes.flags.writeable = False
+    return keyframes
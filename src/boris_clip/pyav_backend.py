@@ -0,0 +1,95 @@
+"""In-process stream-copy extraction with PyAV.
+
+An optional alternative to spawning ffmpeg for ``--fast`` clips: the source
+is opened once and every clip is cut by copying packets straight into a new
+container, so no process start-up or codec initialisation is paid per clip.
+Requires the optional ``av`` package (``pip install boris-clip[pyav]``).
+"""
+
+from pathlib import Path
+
+from .models import Bout, VideoInfo
+
+try:
+    import av
+except ImportError:  # pragma: no cover - exercised only without PyAV
+    av = None
+
+
+def is_available() -> bool:
+    """Return whether PyAV can be imported."""
+    return av is not None
+
+
+def copy_clips(clips: list[tuple[Bout, Path]], video: VideoInfo) -> list[Path]:
+    """Stream-copy every clip in ``clips`` from one open source container.
+
+    Like ffmpeg's stream copy, each clip starts decoding at the last keyframe
+    at or before its start time, with timestamps relative to the requested
+    start so that players skip the frames before it. Raises on any PyAV
+    error; the output of a clip that failed may be left incomplete.
+
+    Returns
+    -------
+    list[Path]
+        Output paths of the clips, all of which were written.
+    """
+    if av is None:
+        raise RuntimeError("PyAV is not installed")
+
+    with av.open(video.path) as source:
+        in_video = source.streams.video[0]
+        in_audio = source.streams.audio[0] if source.streams.audio else None
+        for bout, output_path in clips:
+            _copy_clip(source, in_video, in_audio, bout, output_path)
+    return [output_path for _, output_path in clips]
+
+
+def _copy_clip(source, in_video, in_audio, bout: Bout, output_path: Path) -> None:
+    """Copy the packets of one clip from ``source`` into ``output_path``."""
+    streams = [in_video] if in_audio is None else [in_video, in_audio]
+    # Bout times count from the start of the file, as for ffmpeg's -ss
+    offset = (source.start_time or 0) / av.time_base
+    start, stop = bout.start + offset, bout.stop + offset
+    # Seek in AV_TIME_BASE units to the keyframe at or before the start
+    source.seek(int(start * av.time_base), backward=True, any_frame=False)
+
+    with av.open(str(output_path), "w") as out:
+        out_streams = {s.index: out.add_stream_from_template(s) for s in streams}
+        started = False  # whether the first keyframe has been copied
+        video_done = False
+        audio_done = in_audio is None
+
+        for packet in source.demux(streams):
+            if packet.dts is None or packet.pts is None:
+                continue  # flush packet at end of stream
+            pts_time = float(packet.pts * packet.time_base)
+
+            if packet.stream.index == in_video.index:
+                if not started:
+                    if not packet.is_keyframe:
+                        continue
+                    started = True
+                # Packets arrive in decode order, so only stop once decoding
+                # has passed the end; B-frames before it are still copied
+                if float(packet.dts * packet.time_base) >= stop:
+                    video_done = True
+                elif pts_time < stop:
+                    _write(out, out_streams, packet, start)
+            elif started:
+                if pts_time >= stop:
+                    audio_done = True
+                elif pts_time >= start:
+                    _write(out, out_streams, packet, start)
+
+            if video_done and audio_done:
+                break
+
+
+def _write(out, out_streams: dict, packet, origin: float) -> None:
+    """Rebase ``packet`` so the clip starts at zero and mux it into ``out``."""
+    offset = round(origin / packet.time_base)
+    packet.pts -= offset
+    packet.dts -= offset
+    packet.stream = out_streams[packet.stream.index]
+    out.mux(packet)
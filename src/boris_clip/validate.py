@@ -1,5 +1,7 @@
 """Validation: cross-check BORIS annotations against video metadata."""
 
+import numpy as np
+
 from .cli_utils import abort, warn
 
 from .models import Bout, ParsedAnnotations, VideoInfo
@@ -89,18 +91,18 @@ def _check_bout_bounds(
     video: VideoInfo,
     force: bool,
 ) -> None:
-    violations = [
-        b for b in annotations.bouts if b.stop > video.duration + _DURATION_TOLERANCE
-    ]
-    if violations:
+    bouts = annotations.bouts
+    stops = np.fromiter((b.stop for b in bouts), dtype=np.float64, count=len(bouts))
+    violations = np.flatnonzero(stops > video.duration + _DURATION_TOLERANCE)
+    if violations.size:
         details = "; ".join(
-            f"{b.behaviour!r}/{b.subject!r} ends at {b.stop:.3f}s"
-            for b in violations[:5]
+            f"{bouts[i].behaviour!r}/{bouts[i].subject!r} ends at {bouts[i].stop:.3f}s"
+            for i in violations[:5]
         )
-        if len(violations) > 5:
-            details += f" ... and {len(violations) - 5} more"
+        if violations.size > 5:
+            details += f" ... and {violations.size - 5} more"
         _hard(
-            f"{len(violations)} bout(s) end after the video duration "
+            f"{violations.size} bout(s) end after the video duration "
             f"({video.duration:.3f}s): {details}.",
             force,
         )
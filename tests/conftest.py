@@ -0,0 +1,39 @@
+# conftest.py
+#
+# Fixtures shared across test modules. Models are frozen dataclasses, so one
+# instance per session can be shared safely; derive variants with
+# dataclasses.replace instead of mutating them.
+#
+# Session scope is per process: under pytest-xdist each worker builds its
+# own instances, and tmp_path_factory already gives every worker a separate
+# base directory, so nothing here is shared between workers.
+
+import pytest
+
+from boris_clip.models import Bout, VideoInfo
+
+
+@pytest.fixture(scope="session")
+def video():
+    return VideoInfo(
+        path="/data/recording.mp4",
+        filename="recording.mp4",
+        duration=120.0,
+        fps=25.0,
+    )
+
+
+@pytest.fixture(scope="session")
+def state_bout():
+    return Bout(subject="ind1", behaviour="walking", start=10.0, stop=15.0)
+
+
+@pytest.fixture(scope="session")
+def point_bout():
+    return Bout(subject="ind1", behaviour="scratch", start=20.0, stop=20.0, is_point=True)
+
+
+@pytest.fixture(scope="session")
+def shared_tmp(tmp_path_factory):
+    """Scratch directory for tests that only build paths and never write to them."""
+    return tmp_path_factory.mktemp("shared")
@@ -2,75 +2,105 @@
 #
 # Tests:
 # - build_output_path: correct filename pattern
+# - build_output_path: a missing subject is named no-focal-subject
 # - build_output_path: zero-padding width scales with total count
 # - build_output_path: special characters in names are sanitised
+# - _sanitise_name: ASCII and non-ASCII names
 # - Bout.with_padding: padding is applied correctly
 # - Bout.with_padding: start is clamped to 0
 # - Bout.with_padding: stop is clamped to video duration
 # - Bout.with_padding: point event padded correctly
 # - extract_all_clips: creates output directory
 # - extract_all_clips: per-group indexing is correct
-# - extract_all_clips: zero-duration padded bouts are skipped
-
+# - extract_all_clips: zero-duration and sub-frame padded bouts are skipped
+# - extract_all_clips: a fast clip spanning the whole video is a copy of the file
+# - extract_all_clips: padding matches Bout.with_padding for state and point events
+# - extract_all_clips: parallel jobs report progress for every clip
+# - extract_all_clips: clips that failed to extract are not returned
+# - _build_command: several clips share one ffmpeg process
+# - _build_command: both modes seek before each input
+# - _build_command: runs the ffmpeg executable it is given
+# - _build_command: -threads on each input and output when re-encoding
+# - extract_all_clips: codec threads share the CPUs unless set explicitly
+# - _build_command: hardware encoder options per input/output, ignored when fast
+# - _build_command / extract_clips: audio copy, retried with audio re-encoded on failure
+# - extract_clips: failures unrelated to audio go straight to per-clip retries
+# - extract_clips: clips only take their final name once complete
+# - _merge_overlapping: only overlapping clips are grouped
+# - _decode_groups: long runs of nearby clips share a decode, short ones do not
+# - _build_merged_command: one input, split and trimmed per clip
+# - _build_merged_command: no audio graph for silent videos
+# - extract_all_clips: overlapping clips are re-encoded together, not when fast
+# - extract_all_clips: fast_points stream-copies point events only
+# - extract_all_clips: stream-copied starts snap back to keyframes, with a warning when far
+# - extract_all_clips: snapped clips are capped at max_duration again
+# - extract_all_clips: the pyav backend copies clips, falling back to ffmpeg on error
+# - extract_all_clips: up-to-date clips from an earlier run are skipped, empty ones are not
+# - extract_all_clips: changed padding or --force-rebuild extracts again
+# - extract_all_clips: toggling copy_audio extracts re-encoded clips again
+# - extract_all_clips: manifest entries can be collected and written by the caller
+# - update_manifest: a failed write leaves no temporary file behind
+
+import os
+import re
+from dataclasses import replace
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 
+import numpy as np
 import pytest
 
-from boris_clip.clip import build_output_path, extract_all_clips
+from boris_clip.clip import (
+    _apply_max_clips,
+    _build_command,
+    _build_merged_command,
+    _decode_groups,
+    _merge_overlapping,
+    _sanitise_name,
+    build_output_path,
+    extract_all_clips,
+    extract_clips,
+    update_manifest,
+)
 from boris_clip.models import Bout, VideoInfo
 
 
 # ---------------------------------------------------------------------------
-# Fixtures
+# build_output_path
 # ---------------------------------------------------------------------------
 
-@pytest.fixture
-def video():
-    return VideoInfo(
-        path="/data/recording.mp4",
-        filename="recording.mp4",
-        duration=120.0,
-        fps=25.0,
-    )
-
-
-@pytest.fixture
-def state_bout():
-    return Bout(subject="ind1", behaviour="walking", start=10.0, stop=15.0)
-
-
-@pytest.fixture
-def point_bout():
-    return Bout(subject="ind1", behaviour="scratch", start=20.0, stop=20.0, is_point=True)
-
+# Written out independently of the sanitiser in clip.py, so that the test
+# checks the names it produces rather than restating it
+_SAFE_FILENAME = re.compile(r"[\w\-.]+")
 
-# ---------------------------------------------------------------------------
-# build_output_path
-# ---------------------------------------------------------------------------
 
 class TestBuildOutputPath:
-    def test_filename_pattern(self, tmp_path, video, state_bout):
-        p = build_output_path(state_bout, video, tmp_path, original_start=10.0, original_stop=15.0)
+    def test_filename_pattern(self, shared_tmp, video, state_bout):
+        p = build_output_path(
+            state_bout, video, shared_tmp, original_start=10.0, original_stop=15.0
+        )
         assert p.name == "recording_walking_ind1_10.000-15.000.mp4"
 
-    def test_no_focal_subject(self, tmp_path, video):
-        bout = Bout(subject="No focal subject", behaviour="REM", start=1.5, stop=6.0)
-        p = build_output_path(bout, video, tmp_path, original_start=1.5, original_stop=6.0)
-        assert "no-focal-subject" in p.name
-        assert "__" not in p.name
+    @pytest.mark.parametrize("subject", ["No focal subject", ""])
+    def test_no_focal_subject(self, shared_tmp, video, subject):
+        bout = Bout(subject=subject, behaviour="REM", start=1.5, stop=6.0)
+        p = build_output_path(bout, video, shared_tmp, original_start=1.5, original_stop=6.0)
+        assert p.name == "recording_REM_no-focal-subject_1.500-6.000.mp4"
 
-    def test_empty_subject(self, tmp_path, video):
-        bout = Bout(subject="", behaviour="REM", start=1.5, stop=6.0)
-        p = build_output_path(bout, video, tmp_path, original_start=1.5, original_stop=6.0)
-        assert "no-focal-subject" in p.name
-        assert "__" not in p.name
-
-    def test_special_chars_sanitised(self, tmp_path, video):
+    def test_special_chars_sanitised(self, shared_tmp, video):
         bout = Bout(subject="ind 1 (A)", behaviour="arm wave!", start=0.0, stop=5.0)
-        p = build_output_path(bout, video, tmp_path, original_start=0.0, original_stop=5.0)
-        import re
-        assert re.fullmatch(r"[\w\-_.]+", p.name), f"Unexpected characters in {p.name!r}"
+        p = build_output_path(bout, video, shared_tmp, original_start=0.0, original_stop=5.0)
+        assert _SAFE_FILENAME.fullmatch(p.name), f"Unexpected characters in {p.name!r}"
+
+    @pytest.mark.parametrize("name, expected", [
+        ("  arm wave!  ", "arm_wave"),
+        ("ind 1 (A)", "ind_1_A"),
+        ("a//--b", "a_--b"),
+        ("tête-à-tête", "tête-à-tête"),
+        ("größe / 2", "größe_2"),
+    ])
+    def test_sanitise_name(self, name, expected):
+        assert _sanitise_name(name) == expected
 
 
 # ---------------------------------------------------------------------------
@@ -98,36 +128,152 @@ class TestBoutWithPadding:
         assert padded.duration == pytest.approx(10.0)
 
 
+def _touch_outputs(clips, video=None):
+    """Stand-in for a backend that writes every clip it is given."""
+    for _, output_path in clips:
+        output_path.write_bytes(b"clip")
+
+
+def _fake_ffmpeg(*results):
+    """Stand-in for _run_ffmpeg returning ``results`` in turn.
+
+    Every output of the command is written, even by runs that fail, just as
+    ffmpeg leaves partial files behind.
+    """
+    results = list(results)
+
+    def run(cmd):
+        for prev, arg in zip(cmd, cmd[1:]):
+            if arg.endswith(".mp4") and prev != "-i":
+                Path(arg).write_bytes(b"clip")
+        return results.pop(0)
+    return run
+
+
+@pytest.fixture
+def fake_extract(monkeypatch):
+    """Replace extract_clips with a stub recording the arguments of each call."""
+    calls = []
+
+    def extract(clips, video, **kwargs):
+        calls.append({"clips": clips, "video": video, **kwargs})
+        return [output_path for _, output_path in clips]
+    monkeypatch.setattr("boris_clip.clip.extract_clips", extract)
+    return calls
+
+
+def _extracted(calls):
+    """All (bout, output_path) pairs passed to the stubbed extract_clips."""
+    return [clip for call in calls for clip in call["clips"]]
+
+
 # ---------------------------------------------------------------------------
 # extract_all_clips
 # ---------------------------------------------------------------------------
 
+@pytest.fixture(scope="module")
+def run_bouts():
+    return (
+        Bout("A", "run", 0.0, 5.0),
+        Bout("A", "run", 10.0, 15.0),
+        Bout("B", "run", 20.0, 25.0),
+    )
+
+
 class TestExtractAllClips:
-    def _make_bouts(self):
-        return [
-            Bout("A", "run", 0.0, 5.0),
-            Bout("A", "run", 10.0, 15.0),
-            Bout("B", "run", 20.0, 25.0),
+    # 3 clips over 2 jobs run as batches of 2 and 1 clips, so 12 CPUs give
+    # 12 // (2 * 2) and 12 // (2 * 1) threads per encoder
+    @pytest.mark.parametrize("codec_threads, expected", [(None, [3, 6]), (5, [5, 5])])
+    @patch("boris_clip.clip.available_cpus", return_value=12)
+    def test_codec_threads(
+        self, _cpus, run_bouts, fake_extract, tmp_path, video, codec_threads, expected
+    ):
+        extract_all_clips(
+            run_bouts, video, tmp_path, jobs=2, codec_threads=codec_threads
+        )
+        threads = sorted(call["threads"] for call in fake_extract)
+        assert threads == expected
+
+    def test_fast_points(self, fake_extract, tmp_path, video):
+        bouts = [Bout("A", "run", 0.0, 5.0), Bout("A", "jump", 40.0, 40.0, is_point=True)]
+        extract_all_clips(bouts, video, tmp_path, fast_points=True)
+        modes = {call["clips"][0][0].is_point: call["fast"] for call in fake_extract}
+        assert modes == {True: True, False: False}
+
+    @patch("boris_clip.clip.probe_keyframes", return_value=np.array([0.0, 2.0, 4.0, 6.0]))
+    def test_fast_starts_snap_to_keyframes(self, _kf, fake_extract, tmp_path, video, capsys):
+        bouts = [
+            Bout("A", "run", 1.0, 3.0),
+            Bout("A", "jump", 4.4, 4.4, is_point=True),
+            Bout("A", "run", 5.9, 8.0),
+        ]
+        extract_all_clips(
+            bouts, video, tmp_path, point_padding_pre=0.0, point_padding_post=1.0,
+            fast_points=True,
+        )
+        got = sorted((b.start, b.stop) for b, _ in _extracted(fake_extract))
+        # Only the point event is stream-copied; its stop is left alone
+        assert got == [(1.0, 3.0), (4.0, 5.4), (5.9, 8.0)]
+        assert capsys.readouterr().err == ""
+
+        extract_all_clips(bouts, video, tmp_path / "fast", fast=True)
+        assert "2 stream-copied clip(s)" in capsys.readouterr().err
+
+    @patch("boris_clip.clip.probe_keyframes", return_value=np.array([0.0, 10.0]))
+    def test_snapped_clips_keep_max_duration(self, _kf, fake_extract, tmp_path, video):
+        bouts = [Bout("A", "run", 8.0, 30.0)]
+        extract_all_clips(bouts, video, tmp_path, fast=True, max_duration=5.0)
+        [(bout, _)] = _extracted(fake_extract)
+        assert (bout.start, bout.stop) == (0.0, 5.0)
+
+    @patch("boris_clip.pyav_backend.copy_clips", side_effect=_touch_outputs)
+    def test_pyav_backend(self, mock_copy, run_bouts, fake_extract, tmp_path, video):
+        extract_all_clips(run_bouts, video, tmp_path, fast=True, backend="pyav", jobs=1)
+        assert len(mock_copy.call_args.args[0]) == 3
+        assert not fake_extract
+
+    @patch("boris_clip.pyav_backend.copy_clips", side_effect=RuntimeError("boom"))
+    def test_pyav_backend_falls_back(
+        self, mock_copy, run_bouts, fake_extract, tmp_path, video, capsys
+    ):
+        extract_all_clips(run_bouts, video, tmp_path, fast=True, backend="pyav", jobs=1)
+        assert fake_extract[-1]["fast"] is True
+        assert "falling back to ffmpeg" in capsys.readouterr().err
+
+    def test_padding_matches_with_padding(self, fake_extract, tmp_path, video):
+        bouts = [
+            Bout("A", "run", 1.0, 5.0),
+            Bout("A", "run", 60.0, 118.5),
+            Bout("A", "jump", 40.0, 40.0, is_point=True),
         ]
+        extract_all_clips(
+            bouts, video, tmp_path, padding_pre=2.0, padding_post=3.0,
+            point_padding_pre=1.0, point_padding_post=4.0, fast=True,
+        )
+        got = sorted((b.start, b.stop) for b, _ in _extracted(fake_extract))
+        expected = sorted(
+            (p.start, p.stop) for p in (
+                bouts[0].with_padding(2.0, 3.0, video.duration),
+                bouts[1].with_padding(2.0, 3.0, video.duration),
+                bouts[2].with_padding(1.0, 4.0, video.duration),
+            )
+        )
+        assert got == expected
 
-    @patch("boris_clip.clip.extract_clip")
-    def test_creates_output_directory(self, mock_extract, tmp_path, video):
+    def test_creates_output_directory(self, run_bouts, fake_extract, tmp_path, video):
         out = tmp_path / "new_clips"
-        extract_all_clips(self._make_bouts(), video, out)
+        extract_all_clips(run_bouts, video, out)
         assert out.exists()
 
-    @patch("boris_clip.clip.extract_clip")
-    def test_interval_in_filename(self, mock_extract, tmp_path, video):
-        bouts = self._make_bouts()
-        extract_all_clips(bouts, video, tmp_path)
-        names = [call.kwargs["output_path"].name for call in mock_extract.call_args_list]
+    def test_interval_in_filename(self, run_bouts, fake_extract, tmp_path, video):
+        extract_all_clips(run_bouts, video, tmp_path)
+        names = [out.name for _, out in _extracted(fake_extract)]
         # Original bout times appear in filenames
         assert any("0.000-5.000" in n for n in names)
         assert any("10.000-15.000" in n for n in names)
         assert any("20.000-25.000" in n for n in names)
 
-    @patch("boris_clip.clip.extract_clip")
-    def test_zero_duration_bout_skipped(self, mock_extract, tmp_path, video):
+    def test_zero_duration_bout_skipped(self, fake_extract, tmp_path, video):
         # A point event with no padding yields zero duration -> skipped
         bouts = [Bout("ind1", "scratch", 10.0, 10.0, is_point=True)]
         created = extract_all_clips(
@@ -136,7 +282,260 @@ class TestExtractAllClips:
             point_padding_post=0.0,
         )
         assert len(created) == 0
-        mock_extract.assert_not_called()
+        assert not fake_extract
+
+    def test_sub_frame_bout_skipped(self, fake_extract, tmp_path, video):
+        # 25 fps: a 0.02s clip is half a frame
+        bouts = [Bout("ind1", "scratch", 10.0, 10.0, is_point=True)]
+        created = extract_all_clips(
+            bouts, video, tmp_path, point_padding_pre=0.01, point_padding_post=0.01,
+        )
+        assert created == []
+        assert not fake_extract
+
+    def test_whole_video_copied(self, fake_extract, tmp_path, video):
+        source = tmp_path / "recording.mp4"
+        source.write_bytes(b"video")
+        video = VideoInfo(str(source), source.name, duration=120.0, fps=25.0)
+        bouts = [Bout("A", "run", 0.0, 120.0), Bout("A", "run", 10.0, 15.0)]
+        created = extract_all_clips(bouts, video, tmp_path / "clips", fast=True)
+        assert created[0].read_bytes() == b"video"
+        assert [out for _, out in _extracted(fake_extract)] == [created[1]]
+
+    def test_parallel_jobs_report_every_clip(self, run_bouts, fake_extract, tmp_path, video):
+        seen = []
+        created = extract_all_clips(
+            run_bouts, video, tmp_path,
+            jobs=3,
+            progress_callback=lambda current, total, path, cached: seen.append((current, total)),
+        )
+        assert len(_extracted(fake_extract)) == 3
+        assert [c for c, _ in seen] == [1, 2, 3]
+        assert all(t == 3 for _, t in seen)
+        # Results come back in bout order regardless of completion order
+        assert [p.name.split("_")[-1] for p in created] == [
+            "0.000-5.000.mp4", "10.000-15.000.mp4", "20.000-25.000.mp4",
+        ]
+
+    def test_failed_clips_not_returned(self, run_bouts, tmp_path, video):
+        def extract(clips, video, **kwargs):
+            return [output_path for bout, output_path in clips if bout.start != 10.0]
+
+        with patch("boris_clip.clip.extract_clips", side_effect=extract):
+            created = extract_all_clips(run_bouts, video, tmp_path, jobs=3)
+        assert [p.name.split("_")[-1] for p in created] == [
+            "0.000-5.000.mp4", "20.000-25.000.mp4",
+        ]
+
+
+# ---------------------------------------------------------------------------
+# _build_command
+# ---------------------------------------------------------------------------
+
+class TestBuildCommand:
+    def _clips(self, shared_tmp):
+        return [
+            (Bout("A", "run", 10.0, 15.0), shared_tmp / "a.mp4"),
+            (Bout("B", "run", 30.0, 32.0), shared_tmp / "b.mp4"),
+        ]
+
+    def test_one_process_for_many_clips(self, shared_tmp, video):
+        cmd = _build_command(self._clips(shared_tmp), video, fast=False)
+        assert cmd.count("-i") == 2
+        assert cmd[-1] == str(shared_tmp / "b.mp4")
+        assert str(shared_tmp / "a.mp4") in cmd
+
+    def test_uses_resolved_ffmpeg(self, shared_tmp, video):
+        cmd = _build_command(self._clips(shared_tmp), video, fast=True, ffmpeg_bin="/opt/ffmpeg")
+        assert cmd[0] == "/opt/ffmpeg"
+
+    @pytest.mark.parametrize("fast", [True, False])
+    def test_seeks_before_input(self, shared_tmp, video, fast):
+        cmd = _build_command(self._clips(shared_tmp), video, fast=fast)
+        first_input = cmd.index("-i")
+        assert cmd.index("-ss") < first_input
+        assert cmd[cmd.index("-ss") + 1] == "10.000000"
+        assert ("copy" in cmd) == fast
+
+    def test_threads_per_decoder_and_encoder(self, shared_tmp, video):
+        cmd = _build_command(self._clips(shared_tmp), video, fast=False, threads=3)
+        assert cmd.count("-threads") == 4
+        assert all(cmd[i + 1] == "3" for i, arg in enumerate(cmd) if arg == "-threads")
+        assert "-threads" not in _build_command(self._clips(shared_tmp), video, fast=True)
+
+    def test_copy_audio(self, shared_tmp, video):
+        cmd = _build_command(self._clips(shared_tmp), video, fast=False, copy_audio=True)
+        assert cmd.count("-c:a") == 2
+        assert "make_zero" not in cmd
+
+    @patch(
+        "boris_clip.clip._run_ffmpeg",
+        side_effect=_fake_ffmpeg((1, "could not write header"), (0, "")),
+    )
+    def test_copy_audio_retried_reencoded(self, mock_run, tmp_path, video):
+        written = extract_clips(self._clips(tmp_path), video, copy_audio=True)
+        assert len(written) == 2
+        assert all(path.exists() for path in written)
+        assert "-c:a" in mock_run.call_args_list[0].args[0]
+        assert "-c:a" not in mock_run.call_args_list[1].args[0]
+        assert sorted(p.name for p in tmp_path.iterdir()) == sorted(p.name for p in written)
+
+    @patch(
+        "boris_clip.clip._run_ffmpeg",
+        side_effect=_fake_ffmpeg((1, "Invalid data found"), (0, ""), (0, "")),
+    )
+    def test_other_failures_retried_per_clip(self, mock_run, tmp_path, video):
+        written = extract_clips(self._clips(tmp_path), video, copy_audio=True)
+        assert len(written) == 2
+        # No batch-wide retry with audio re-encoded; each clip still copies it
+        assert mock_run.call_count == 3
+        assert all("-c:a" in call.args[0] for call in mock_run.call_args_list)
+
+    @patch("boris_clip.clip._run_ffmpeg", side_effect=_fake_ffmpeg((1, "killed")))
+    def test_failed_run_leaves_no_output(self, _mock, tmp_path, video, capsys):
+        assert extract_clips(self._clips(tmp_path)[:1], video) == []
+        assert list(tmp_path.iterdir()) == []
+        assert "killed" in capsys.readouterr().err
+
+    def test_hw_encoder_options(self, shared_tmp, video):
+        cmd = _build_command(self._clips(shared_tmp), video, fast=False, encoder="vaapi")
+        assert cmd.count("-vaapi_device") == 1
+        assert cmd.count("-hwaccel") == 2
+        assert cmd.count("h264_vaapi") == 2
+
+    def test_hw_encoder_ignored_when_fast(self, shared_tmp, video):
+        cmd = _build_command(self._clips(shared_tmp), video, fast=True, encoder="nvenc")
+        assert "-hwaccel" not in cmd
+        assert "h264_nvenc" not in cmd
+
+
+# ---------------------------------------------------------------------------
+# Overlapping clips
+# ---------------------------------------------------------------------------
+
+class TestMergeOverlapping:
+    def _clips(self, shared_tmp):
+        return [
+            (Bout("A", "run", 10.0, 15.0), shared_tmp / "a.mp4"),
+            (Bout("B", "run", 30.0, 32.0), shared_tmp / "c.mp4"),
+            (Bout("B", "run", 12.0, 20.0), shared_tmp / "b.mp4"),
+        ]
+
+    def test_groups_only_overlapping(self, shared_tmp):
+        groups = _merge_overlapping(self._clips(shared_tmp))
+        assert [[p.name for _, p in g] for g in groups] == [["a.mp4", "b.mp4"], ["c.mp4"]]
+
+    def test_touching_clips_not_grouped(self, shared_tmp):
+        clips = [
+            (Bout("A", "run", 0.0, 5.0), shared_tmp / "a.mp4"),
+            (Bout("A", "run", 5.0, 8.0), shared_tmp / "b.mp4"),
+        ]
+        assert len(_merge_overlapping(clips)) == 2
+
+    def test_dense_runs_grouped(self, shared_tmp):
+        def spaced(n, gap):
+            return [
+                (Bout("A", "run", i * (1.0 + gap), i * (1.0 + gap) + 1.0), shared_tmp / f"{i}.mp4")
+                for i in range(n)
+            ]
+        assert [len(g) for g in _decode_groups(spaced(9, 1.5))] == [9]
+        assert [len(g) for g in _decode_groups(spaced(8, 1.5))] == [1] * 8
+        assert [len(g) for g in _decode_groups(spaced(9, 3.0))] == [1] * 9
+
+    def test_merged_command_single_input(self, shared_tmp, video):
+        group = _merge_overlapping(self._clips(shared_tmp))[0]
+        cmd = _build_merged_command(group, video)
+        assert cmd.count("-i") == 1
+        assert cmd[cmd.index("-ss") + 1] == "10.000000"
+        assert cmd[cmd.index("-t") + 1] == "10.000000"
+        graph = cmd[cmd.index("-filter_complex") + 1]
+        assert "split=2" in graph and "asplit=2" in graph
+        assert "trim=start=2.000000:end=10.000000" in graph
+        assert cmd[-1] == str(shared_tmp / "b.mp4")
+
+    def test_merged_command_without_audio(self, shared_tmp, video):
+        video = replace(video, has_audio=False)
+        group = _merge_overlapping(self._clips(shared_tmp))[0]
+        cmd = _build_merged_command(group, video)
+        assert "asplit" not in cmd[cmd.index("-filter_complex") + 1]
+        assert not any(arg.startswith("[oa") for arg in cmd)
+
+    @pytest.mark.parametrize("fast", [True, False])
+    @patch("boris_clip.clip._extract_merged")
+    def test_extract_all_routes_overlaps(
+        self, mock_merged, fake_extract, tmp_path, video, fast
+    ):
+        bouts = [Bout("A", "run", 10.0, 15.0), Bout("A", "run", 16.0, 20.0)]
+        extract_all_clips(bouts, video, tmp_path, padding_pre=2.0, padding_post=2.0, fast=fast)
+        assert mock_merged.called != fast
+        assert len(_extracted(fake_extract)) == (2 if fast else 0)
+
+
+# ---------------------------------------------------------------------------
+# Incremental re-runs
+# ---------------------------------------------------------------------------
+
+def _fake_extract(clips, **kwargs):
+    for _, output_path in clips:
+        output_path.write_bytes(b"clip")
+    return [output_path for _, output_path in clips]
+
+
+class TestIncremental:
+    @pytest.fixture
+    def local_video(self, tmp_path):
+        path = tmp_path / "recording.mp4"
+        path.write_bytes(b"video")
+        os.utime(path, ns=(0, 0))
+        return VideoInfo(path=str(path), filename=path.name, duration=120.0, fps=25.0)
+
+    def _run(self, video, out_dir, fast=True, **kwargs):
+        seen = []
+        with patch("boris_clip.clip.extract_clips", side_effect=_fake_extract) as mock_extract:
+            extract_all_clips(
+                [Bout("A", "run", 10.0, 15.0), Bout("A", "run", 30.0, 32.0)],
+                video, out_dir, fast=fast,
+                progress_callback=lambda current, total, path, cached: seen.append(cached),
+                **kwargs,
+            )
+        extracted = sum(len(call.kwargs["clips"]) for call in mock_extract.call_args_list)
+        return extracted, seen
+
+    def test_up_to_date_clips_skipped(self, tmp_path, local_video):
+        assert self._run(local_video, tmp_path / "out") == (2, [False, False])
+        assert self._run(local_video, tmp_path / "out") == (0, [True, True])
+
+    def test_empty_clip_rebuilt(self, tmp_path, local_video):
+        self._run(local_video, tmp_path / "out")
+        next((tmp_path / "out").glob("*.mp4")).write_bytes(b"")
+        assert self._run(local_video, tmp_path / "out") == (1, [True, False])
+
+    def test_manifest_entries_collected(self, tmp_path, local_video):
+        entries = {}
+        self._run(local_video, tmp_path / "out", manifest_entries=entries)
+        assert not (tmp_path / "out" / ".boris-clip.json").exists()
+        assert sorted(entries) == sorted(p.name for p in (tmp_path / "out").glob("*.mp4"))
+        update_manifest(tmp_path / "out", entries)
+        assert self._run(local_video, tmp_path / "out") == (0, [True, True])
+
+    def test_failed_manifest_write_cleaned_up(self, tmp_path, capsys):
+        with patch("boris_clip.clip.os.replace", side_effect=OSError("disk full")):
+            update_manifest(tmp_path, {"a.mp4": "sig"})
+        assert list(tmp_path.iterdir()) == []
+        assert "disk full" in capsys.readouterr().err
+
+    def test_changed_settings_rebuild(self, tmp_path, local_video):
+        self._run(local_video, tmp_path / "out")
+        extracted, _ = self._run(local_video, tmp_path / "out", padding_pre=1.0)
+        assert extracted == 2
+        extracted, _ = self._run(local_video, tmp_path / "out", padding_pre=1.0, force_rebuild=True)
+        assert extracted == 2
+
+    def test_changed_audio_mode_rebuilds(self, tmp_path, local_video):
+        self._run(local_video, tmp_path / "out", fast=False)
+        assert self._run(local_video, tmp_path / "out", fast=False) == (0, [True, True])
+        extracted, _ = self._run(local_video, tmp_path / "out", fast=False, copy_audio=False)
+        assert extracted == 2
 
 
 # ---------------------------------------------------------------------------
@@ -150,45 +549,42 @@ class TestExtractAllClips:
 # - max_duration truncates long clips from the end after padding
 # - max_duration=None does not truncate
 
-class TestMaxClips:
-    def _bouts(self):
-        return [
-            Bout("A", "REM", 0.0, 5.0),
-            Bout("A", "REM", 10.0, 15.0),
-            Bout("A", "REM", 20.0, 25.0),
-            Bout("A", "walking", 5.0, 8.0),
-            Bout("B", "REM", 1.0, 4.0),
-        ]
+@pytest.fixture(scope="module")
+def rem_bouts():
+    return (
+        Bout("A", "REM", 0.0, 5.0),
+        Bout("A", "REM", 10.0, 15.0),
+        Bout("A", "REM", 20.0, 25.0),
+        Bout("A", "walking", 5.0, 8.0),
+        Bout("B", "REM", 1.0, 4.0),
+    )
 
-    def test_limits_per_group(self):
-        from boris_clip.clip import _apply_max_clips
-        kept = _apply_max_clips(self._bouts(), max_clips=2)
+
+class TestMaxClips:
+    def test_limits_per_group(self, rem_bouts):
+        kept = _apply_max_clips(rem_bouts, max_clips=2)
         rem_a = [b for b in kept if b.behaviour == "REM" and b.subject == "A"]
         assert len(rem_a) == 2
         assert rem_a[0].start == pytest.approx(0.0)
         assert rem_a[1].start == pytest.approx(10.0)
 
-    def test_none_keeps_all(self):
-        from boris_clip.clip import _apply_max_clips
-        assert len(_apply_max_clips(self._bouts(), None)) == 5
+    def test_none_keeps_all(self, rem_bouts):
+        assert len(_apply_max_clips(rem_bouts, None)) == 5
 
-    def test_max_clips_one(self):
-        from boris_clip.clip import _apply_max_clips
-        kept = _apply_max_clips(self._bouts(), max_clips=1)
+    def test_max_clips_one(self, rem_bouts):
+        kept = _apply_max_clips(rem_bouts, max_clips=1)
         rem_a = [b for b in kept if b.behaviour == "REM" and b.subject == "A"]
         assert len(rem_a) == 1
         assert rem_a[0].start == pytest.approx(0.0)
 
-    @patch("boris_clip.clip.extract_clip")
-    def test_max_duration_truncates(self, mock_extract, tmp_path, video):
+    def test_max_duration_truncates(self, fake_extract, tmp_path, video):
         bouts = [Bout("A", "REM", 0.0, 30.0)]
         extract_all_clips(bouts, video, tmp_path, max_duration=10.0)
-        call_bout = mock_extract.call_args.kwargs["bout"]
+        call_bout, _ = _extracted(fake_extract)[0]
         assert call_bout.duration == pytest.approx(10.0)
 
-    @patch("boris_clip.clip.extract_clip")
-    def test_max_duration_none_no_truncation(self, mock_extract, tmp_path, video):
+    def test_max_duration_none_no_truncation(self, fake_extract, tmp_path, video):
         bouts = [Bout("A", "REM", 0.0, 30.0)]
         extract_all_clips(bouts, video, tmp_path, max_duration=None)
-        call_bout = mock_extract.call_args.kwargs["bout"]
+        call_bout, _ = _extracted(fake_extract)[0]
         assert call_bout.duration == pytest.approx(30.0)
\ No newline at end of file
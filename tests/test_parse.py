@@ -2,6 +2,7 @@
 #
 # Tests:
 # - Tabular CSV: basic START/STOP pairing produces correct bouts
+# - Tabular CSV: events at the same time keep their file order
 # - Tabular CSV: POINT events are correctly identified
 # - Tabular CSV: unmatched STOP is skipped with a warning
 # - Tabular CSV: unclosed START is skipped with a warning
@@ -9,29 +10,46 @@
 # - Tabular CSV: media filename is extracted from header
 # - Aggregated CSV: start/stop columns produce correct bouts
 # - Aggregated CSV: equal start/stop is treated as point event
+# - Aggregated CSV: rows with missing times are skipped with one warning
+# - Aggregated CSV: FPS and duration are only taken when constant
 # - .boris project file: state events are paired correctly
 # - .boris project file: point events from ethogram are handled
 # - .boris project file: media filename is extracted
+# - .boris project file: NaN values are read with and without orjson
+# - .boris project file: an empty file is reported as invalid JSON
+# - Format detection: tabular, aggregated and legacy tabular exports
 # - Format detection: aborts on unrecognised CSV
+# - CSV reading: metadata lines and unused columns are skipped
+# - _sanitise_column: matches _sanitise_str applied per value
 # - _resolve_padding: --padding sets both sides
 # - _resolve_padding: --padding-pre overrides only pre
 # - _resolve_padding: --padding-post overrides only post
 # - _resolve_padding: both overrides together
+# - _resolve_padding: no padding defaults to zero
+# - parse cache: a hit returns the cached result and replays its warnings
+# - parse cache: a modified file is parsed again
+# - parse cache: nothing is written unless enabled
+# - parse cache: values that cannot be pickled are simply not stored
 
-import io
 import json
 import textwrap
+from unittest.mock import patch
 
-import pandas as pd
 import pytest
 
-from boris_clip.cli import _resolve_padding, _resolve_point_padding
-from boris_clip.models import Bout
+from boris_clip.cli import _resolve_padding
+from boris_clip import cache, parse
+from boris_clip.cli_utils import recording_warnings
 from boris_clip.parse import (
     _detect_csv_format,
+    _read_csv_skip_header,
+    _sanitise_column,
+    _sanitise_str,
     _parse_aggregated_csv,
     _parse_tabular_csv,
+    _parse_boris_dict,
     _parse_boris_project,
+    parse_boris_file,
 )
 
 
@@ -39,34 +57,49 @@ from boris_clip.parse import (
 # Helpers
 # ---------------------------------------------------------------------------
 
-def _tabular_df(rows: list[dict]) -> pd.DataFrame:
-    base = {
-        "Time": [],
-        "Subject": [],
-        "Behavior": [],
-        "Status": [],
-        "Media file path": [],
-        "FPS": [],
-        "Total length": [],
-    }
-    for row in rows:
-        for k, v in row.items():
-            base.setdefault(k, []).append(v)
-        # fill missing keys
-        for k in base:
-            if k not in row:
-                base[k].append(None)
-    return pd.DataFrame(base)
+_TABULAR_COLUMNS = [
+    "Time", "Subject", "Behavior", "Status", "Media file path", "FPS", "Total length",
+]
+
+
+def _tabular_df(rows: list[dict]):
+    # pandas is imported only where it is used, so that collecting this
+    # module (as every -k run does) does not pay for importing it
+    import pandas as pd
+
+    # Columns a row leaves out are filled with NaN, as in a BORIS export;
+    # columns beyond the usual ones are kept after them
+    df = pd.DataFrame.from_records(rows)
+    extra = [c for c in df.columns if c not in _TABULAR_COLUMNS]
+    return df.reindex(columns=_TABULAR_COLUMNS + extra)
+
+
+def _events(*events) -> list[dict]:
+    """Tabular rows from (time, subject, behaviour, status) tuples."""
+    return [
+        {"Time": t, "Subject": subject, "Behavior": behaviour, "Status": status}
+        for t, subject, behaviour, status in events
+    ]
+
 
+def _aggregated_df(rows: list[dict]):
+    import pandas as pd
 
-def _aggregated_df(rows: list[dict]) -> pd.DataFrame:
     return pd.DataFrame(rows)
 
 
-def _boris_project(observations: dict, ethogram: dict | None = None) -> dict:
+def _boris_project(
+    events: list | tuple = (), ethogram: dict | None = None, media: str | None = None
+) -> dict:
+    """A project with one observation, "obs1", built fresh on every call."""
     return {
         "behaviors_conf": ethogram or {},
-        "observations": observations,
+        "observations": {
+            "obs1": {
+                "events": [list(event) for event in events],
+                "file": {"1": [media]} if media else {},
+            },
+        },
     }
 
 
@@ -74,66 +107,73 @@ def _boris_project(observations: dict, ethogram: dict | None = None) -> dict:
 # Tabular CSV
 # ---------------------------------------------------------------------------
 
-class TestTabularCSV:
-    def test_basic_start_stop(self, tmp_path):
-        df = _tabular_df([
-            {"Time": 1.0, "Subject": "ind1", "Behavior": "walking", "Status": "START"},
-            {"Time": 4.0, "Subject": "ind1", "Behavior": "walking", "Status": "STOP"},
-        ])
-        result = _parse_tabular_csv(df, tmp_path / "dummy.csv")
-        assert len(result.bouts) == 1
-        bout = result.bouts[0]
-        assert bout.subject == "ind1"
-        assert bout.behaviour == "walking"
-        assert bout.start == pytest.approx(1.0)
-        assert bout.stop == pytest.approx(4.0)
-        assert not bout.is_point
-
-    def test_point_event(self, tmp_path):
-        df = _tabular_df([
-            {"Time": 2.5, "Subject": "ind1", "Behavior": "scratch", "Status": "POINT"},
-        ])
-        result = _parse_tabular_csv(df, tmp_path / "dummy.csv")
-        assert len(result.bouts) == 1
-        assert result.bouts[0].is_point
-        assert result.bouts[0].start == pytest.approx(2.5)
-        assert result.bouts[0].stop == pytest.approx(2.5)
-
-    def test_unmatched_stop_is_skipped(self, tmp_path, recwarn):
-        df = _tabular_df([
-            {"Time": 5.0, "Subject": "ind1", "Behavior": "walking", "Status": "STOP"},
-        ])
-        result = _parse_tabular_csv(df, tmp_path / "dummy.csv")
-        assert len(result.bouts) == 0
+# Each case: rows, expected (subject, behaviour, start, stop, is_point) bouts,
+# and the warning it should emit, if any
+_TABULAR_CASES = [
+    pytest.param(
+        _events((1.0, "ind1", "walking", "START"), (4.0, "ind1", "walking", "STOP")),
+        [("ind1", "walking", 1.0, 4.0, False)],
+        None,
+        id="start-stop",
+    ),
+    pytest.param(
+        _events((2.5, "ind1", "scratch", "POINT")),
+        [("ind1", "scratch", 2.5, 2.5, True)],
+        None,
+        id="point",
+    ),
+    pytest.param(
+        _events((5.0, "ind1", "walking", "STOP")), [], "no matching START",
+        id="unmatched-stop",
+    ),
+    pytest.param(
+        _events((1.0, "ind1", "walking", "START")), [], "was never closed",
+        id="unclosed-start",
+    ),
+    pytest.param(
+        _events(
+            (0.0, "A", "run", "START"), (1.0, "B", "run", "START"),
+            (2.0, "A", "run", "STOP"), (3.0, "B", "run", "STOP"),
+        ),
+        [("A", "run", 0.0, 2.0, False), ("B", "run", 1.0, 3.0, False)],
+        None,
+        id="subjects-independent",
+    ),
+]
 
-    def test_unclosed_start_is_skipped(self, tmp_path):
-        df = _tabular_df([
-            {"Time": 1.0, "Subject": "ind1", "Behavior": "walking", "Status": "START"},
-        ])
-        result = _parse_tabular_csv(df, tmp_path / "dummy.csv")
-        assert len(result.bouts) == 0
 
-    def test_multiple_subjects_independent(self, tmp_path):
-        df = _tabular_df([
-            {"Time": 0.0, "Subject": "A", "Behavior": "run", "Status": "START"},
-            {"Time": 1.0, "Subject": "B", "Behavior": "run", "Status": "START"},
-            {"Time": 2.0, "Subject": "A", "Behavior": "run", "Status": "STOP"},
-            {"Time": 3.0, "Subject": "B", "Behavior": "run", "Status": "STOP"},
-        ])
-        result = _parse_tabular_csv(df, tmp_path / "dummy.csv")
-        assert len(result.bouts) == 2
-        starts = {b.subject: b.start for b in result.bouts}
-        assert starts["A"] == pytest.approx(0.0)
-        assert starts["B"] == pytest.approx(1.0)
-
-    def test_media_filename_extracted(self, tmp_path):
+class TestTabularCSV:
+    @pytest.mark.parametrize("rows, expected, warning", _TABULAR_CASES)
+    def test_bouts(self, shared_tmp, rows, expected, warning):
+        with recording_warnings() as warnings:
+            result = _parse_tabular_csv(_tabular_df(rows), shared_tmp / "dummy.csv")
+        got = [(b.subject, b.behaviour, b.start, b.stop, b.is_point) for b in result.bouts]
+        assert got == expected
+        if warning is None:
+            assert warnings == []
+        else:
+            assert len(warnings) == 1 and warning in warnings[0]
+
+    def test_simultaneous_events_keep_file_order(self, shared_tmp):
+        # Back-to-back bouts: each STOP must stay before the START at the same time
+        events = [(0.0, "START")]
+        events += [(float(t), status) for t in range(1, 30) for status in ("STOP", "START")]
+        events += [(30.0, "STOP")]
+        rows = [
+            {"Time": t, "Subject": "ind1", "Behavior": "walking", "Status": status}
+            for t, status in events
+        ]
+        result = _parse_tabular_csv(_tabular_df(rows), shared_tmp / "dummy.csv")
+        assert [(b.start, b.stop) for b in result.bouts] == [(t, t + 1.0) for t in range(30)]
+
+    def test_media_filename_extracted(self, shared_tmp):
         df = _tabular_df([
             {"Time": 0.0, "Subject": "A", "Behavior": "run", "Status": "START",
              "Media file path": "/data/video.mp4"},
             {"Time": 1.0, "Subject": "A", "Behavior": "run", "Status": "STOP",
              "Media file path": "/data/video.mp4"},
         ])
-        result = _parse_tabular_csv(df, tmp_path / "dummy.csv")
+        result = _parse_tabular_csv(df, shared_tmp / "dummy.csv")
         assert result.media_filename == "video.mp4"
 
 
@@ -142,23 +182,42 @@ class TestTabularCSV:
 # ---------------------------------------------------------------------------
 
 class TestAggregatedCSV:
-    def test_basic_bout(self, tmp_path):
+    @pytest.mark.parametrize("start, stop, is_point", [
+        pytest.param(10.0, 15.5, False, id="state"),
+        pytest.param(7.0, 7.0, True, id="equal-times-point"),
+    ])
+    def test_bout(self, shared_tmp, start, stop, is_point):
         df = _aggregated_df([
-            {"Subject": "ind1", "Behavior": "grooming", "Start (s)": 10.0, "Stop (s)": 15.5},
+            {"Subject": "ind1", "Behavior": "grooming", "Start (s)": start, "Stop (s)": stop},
         ])
-        result = _parse_aggregated_csv(df, tmp_path / "dummy.csv")
-        assert len(result.bouts) == 1
-        b = result.bouts[0]
-        assert b.start == pytest.approx(10.0)
-        assert b.stop == pytest.approx(15.5)
-        assert not b.is_point
+        result = _parse_aggregated_csv(df, shared_tmp / "dummy.csv")
+        assert [(b.start, b.stop, b.is_point) for b in result.bouts] == [(start, stop, is_point)]
+
+    def test_constant_metadata(self, shared_tmp):
+        df = _aggregated_df([
+            {"Subject": "a", "Behavior": "run", "Start (s)": 1.0, "Stop (s)": 2.0,
+             "Media file path": None, "FPS": 25.0, "Total length": 60.0},
+            {"Subject": "a", "Behavior": "run", "Start (s)": 3.0, "Stop (s)": 4.0,
+             "Media file path": "/data/v.mp4", "FPS": 25.0, "Total length": 61.0},
+            {"Subject": "a", "Behavior": "run", "Start (s)": 5.0, "Stop (s)": 6.0,
+             "Media file path": "/data/w.mp4", "FPS": None, "Total length": 60.0},
+        ])
+        result = _parse_aggregated_csv(df, shared_tmp / "dummy.csv")
+        assert result.media_filename == "v.mp4"
+        assert result.fps == pytest.approx(25.0)
+        assert result.duration is None
 
-    def test_equal_start_stop_is_point(self, tmp_path):
+    def test_missing_times_skipped(self, shared_tmp, capsys):
         df = _aggregated_df([
-            {"Subject": "ind1", "Behavior": "vocalise", "Start (s)": 7.0, "Stop (s)": 7.0},
+            {"Subject": "ind1", "Behavior": "run", "Start (s)": 1.0, "Stop (s)": None},
+            {"Subject": "ind1", "Behavior": "run", "Start (s)": 2.0, "Stop (s)": 3.0},
+            {"Subject": "ind2", "Behavior": "run", "Start (s)": "n/a", "Stop (s)": 5.0},
         ])
-        result = _parse_aggregated_csv(df, tmp_path / "dummy.csv")
-        assert result.bouts[0].is_point
+        result = _parse_aggregated_csv(df, shared_tmp / "dummy.csv")
+        assert [(b.subject, b.start, b.stop) for b in result.bouts] == [("ind1", 2.0, 3.0)]
+        err = capsys.readouterr().err
+        assert err.count("Warning:") == 1
+        assert "Skipping 2 row(s)" in err
 
 
 # ---------------------------------------------------------------------------
@@ -173,17 +232,10 @@ class TestBorisProject:
 
     def test_state_event_pairing(self, tmp_path):
         project = _boris_project(
+            events=[[1.0, "ind1", "walking", "", ""], [4.0, "ind1", "walking", "", ""]],
             # Use behaviors_conf with code, matching the real BORIS format
             ethogram={"0": {"code": "walking", "type": "State event"}},
-            observations={
-                "obs1": {
-                    "events": [
-                        [1.0, "ind1", "walking", "", ""],
-                        [4.0, "ind1", "walking", "", ""],
-                    ],
-                    "file": {"1": ["/data/video.mp4"]},
-                }
-            },
+            media="/data/video.mp4",
         )
         self._write_project(tmp_path, project)
         results = _parse_boris_project(tmp_path / "test.boris")
@@ -194,32 +246,42 @@ class TestBorisProject:
         assert result.bouts[0].stop == pytest.approx(4.0)
         assert not result.bouts[0].is_point
 
-    def test_point_event_from_ethogram(self, tmp_path):
+    @pytest.mark.parametrize("decoder", ["orjson", "json"])
+    def test_non_finite_numbers(self, tmp_path, monkeypatch, decoder):
+        # json.dump writes NaN for missing values, which orjson rejects
+        if decoder == "json":
+            monkeypatch.setattr("boris_clip.parse.orjson", None)
+        elif parse.orjson is None:
+            pytest.skip("orjson is not installed")
         project = _boris_project(
-            ethogram={"0": {"code": "scratch", "type": "Point event"}},
-            observations={
-                "obs1": {
-                    "events": [[2.0, "ind1", "scratch", "", ""]],
-                    "file": {},
-                }
-            },
+            events=[[1.0, "ind1", "walking", "", ""], [4.0, "ind1", "walking", "", ""]],
         )
+        project["observations"]["obs1"]["media_info"] = {
+            "fps": {"1": float("nan")}, "length": {"1": 60.0},
+        }
         self._write_project(tmp_path, project)
-        results = _parse_boris_project(tmp_path / "test.boris")
-        assert len(results) == 1
-        assert results[0].bouts[0].is_point
+        [result] = _parse_boris_project(tmp_path / "test.boris")
+        assert [(b.start, b.stop) for b in result.bouts] == [(1.0, 4.0)]
+        assert result.duration == pytest.approx(60.0)
+
+    def test_empty_file_is_invalid_json(self, tmp_path):
+        path = tmp_path / "test.boris"
+        path.write_bytes(b"")
+        with pytest.raises(json.JSONDecodeError):
+            _parse_boris_project(path)
 
-    def test_media_filename_from_file_key(self, tmp_path):
+    def test_point_event_from_ethogram(self):
         project = _boris_project(
-            observations={
-                "obs1": {
-                    "events": [],
-                    "file": {"1": ["/some/path/myvideo.mp4"]},
-                }
-            }
+            events=[[2.0, "ind1", "scratch", "", ""]],
+            ethogram={"0": {"code": "scratch", "type": "Point event"}},
         )
-        self._write_project(tmp_path, project)
-        results = _parse_boris_project(tmp_path / "test.boris")
+        results = _parse_boris_dict(project)
+        assert len(results) == 1
+        assert results[0].bouts[0].is_point
+
+    def test_media_filename_from_file_key(self):
+        project = _boris_project(media="/some/path/myvideo.mp4")
+        results = _parse_boris_dict(project)
         assert len(results) == 1
         assert results[0].media_filename == "myvideo.mp4"
 
@@ -229,18 +291,45 @@ class TestBorisProject:
 # ---------------------------------------------------------------------------
 
 class TestFormatDetection:
-    def test_detects_tabular(self):
-        df = pd.DataFrame({"Time": [], "Subject": [], "Behavior": [], "Status": []})
-        assert _detect_csv_format(df) == "tabular"
+    # Detection only looks at column names, so frames without rows will do
+    @pytest.mark.parametrize("columns, expected", [
+        (["Time", "Subject", "Behavior", "Status"], "tabular"),
+        (["Subject", "Behavior", "Start (s)", "Stop (s)"], "aggregated"),
+        (["Time", "Subject", "Behavior", "Behavior type"], "tabular_legacy"),
+    ])
+    def test_detects_format(self, columns, expected):
+        import pandas as pd
 
-    def test_detects_aggregated(self):
-        df = pd.DataFrame({"Subject": [], "Behavior": [], "Start (s)": [], "Stop (s)": []})
-        assert _detect_csv_format(df) == "aggregated"
+        assert _detect_csv_format(pd.DataFrame(columns=columns)) == expected
 
     def test_aborts_on_unknown(self):
-        df = pd.DataFrame({"foo": [], "bar": []})
+        import pandas as pd
+
         with pytest.raises(SystemExit):
-            _detect_csv_format(df)
+            _detect_csv_format(pd.DataFrame(columns=["foo", "bar"]))
+
+    def test_reads_only_used_columns(self, tmp_path):
+        path = tmp_path / "events.csv"
+        path.write_text(textwrap.dedent("""\
+            Observation id,obs1
+            Time,Subject,Behavior,Modifiers,Status,Comment
+            1.0,A,run,,START,first
+        """))
+        df = _read_csv_skip_header(path)
+        assert list(df.columns) == ["Time", "Subject", "Behavior", "Status"]
+        assert _detect_csv_format(df) == "tabular"
+
+
+@pytest.mark.parametrize("values", [
+    [" ind1 ", None, 3, float("nan")],
+    [1.0, 2.5],
+    [],
+])
+def test_sanitise_column_matches_sanitise_str(values):
+    import pandas as pd
+
+    column = pd.Series(values, dtype=float if not values else None)
+    assert _sanitise_column(column).tolist() == [_sanitise_str(v) for v in column]
 
 
 # ---------------------------------------------------------------------------
@@ -248,27 +337,60 @@ class TestFormatDetection:
 # ---------------------------------------------------------------------------
 
 class TestPaddingResolution:
-    def test_padding_sets_both(self):
-        pre, post = _resolve_padding(2.0, None, None)
-        assert pre == pytest.approx(2.0)
-        assert post == pytest.approx(2.0)
-
-    def test_padding_pre_overrides(self):
-        pre, post = _resolve_padding(2.0, 1.0, None)
-        assert pre == pytest.approx(1.0)
-        assert post == pytest.approx(2.0)
-
-    def test_padding_post_overrides(self):
-        pre, post = _resolve_padding(2.0, None, 3.0)
-        assert pre == pytest.approx(2.0)
-        assert post == pytest.approx(3.0)
-
-    def test_both_overrides(self):
-        pre, post = _resolve_padding(2.0, 0.5, 4.0)
-        assert pre == pytest.approx(0.5)
-        assert post == pytest.approx(4.0)
-
-    def test_no_padding_defaults_to_zero(self):
-        pre, post = _resolve_padding(None, None, None)
-        assert pre == pytest.approx(0.0)
-        assert post == pytest.approx(0.0)
\ No newline at end of file
+    @pytest.mark.parametrize("padding, pre, post, expected", [
+        (2.0, None, None, (2.0, 2.0)),
+        (2.0, 1.0, None, (1.0, 2.0)),
+        (2.0, None, 3.0, (2.0, 3.0)),
+        (2.0, 0.5, 4.0, (0.5, 4.0)),
+        (None, None, None, (0.0, 0.0)),
+    ])
+    def test_resolve_padding(self, padding, pre, post, expected):
+        assert _resolve_padding(padding, pre, post) == pytest.approx(expected)
+
+
+# ---------------------------------------------------------------------------
+# Parse cache
+# ---------------------------------------------------------------------------
+
+class TestParseCache:
+    _CSV = textwrap.dedent("""\
+        Time,Subject,Behavior,Status,Media file path,FPS,Total length
+        1.0,A,run,START,v.mp4,25,60
+        3.0,A,run,STOP,v.mp4,25,60
+        5.0,A,run,STOP,v.mp4,25,60
+    """)
+
+    @pytest.fixture(autouse=True)
+    def _cache_home(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+    def _write(self, tmp_path, text):
+        path = tmp_path / "events.csv"
+        path.write_text(text)
+        return path
+
+    def test_hit_replays_result_and_warnings(self, tmp_path, capsys):
+        path = self._write(tmp_path, self._CSV)
+        first = parse_boris_file(str(path), use_cache=True)
+        first_err = capsys.readouterr().err
+        with patch("boris_clip.parse._parse_file") as mock_parse:
+            second = parse_boris_file(str(path), use_cache=True)
+        assert not mock_parse.called
+        assert second == first
+        assert "Warning:" in first_err
+        assert capsys.readouterr().err == first_err
+
+    def test_modified_file_is_reparsed(self, tmp_path):
+        path = self._write(tmp_path, self._CSV)
+        parse_boris_file(str(path), use_cache=True)
+        path.write_text(self._CSV.replace("3.0,A,run,STOP", "4.25,A,run,STOP"))
+        (obs,) = parse_boris_file(str(path), use_cache=True)
+        assert obs.bouts[0].stop == pytest.approx(4.25)
+
+    def test_disabled_by_default(self, tmp_path):
+        parse_boris_file(str(self._write(tmp_path, self._CSV)))
+        assert not (tmp_path / "cache").exists()
+
+    def test_unpicklable_value_is_a_miss(self):
+        cache.store("key", lambda: None)  # must not raise
+        assert cache.load("key") is None
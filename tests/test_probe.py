@@ -0,0 +1,147 @@
+# test_probe.py
+#
+# Tests:
+# - probe_video: duration, fps and audio presence are read from ffprobe output
+# - probe_video: the same file is only probed once, even under another name
+# - probe_video: a modified file is probed again
+# - probe_video: with use_cache, later runs reuse the on-disk result
+# - probe_keyframes: keyframe packets relative to the file start; None if ffprobe fails
+# - probe_keyframes: runs the ffprobe executable it is given
+# - probe_keyframes: with use_cache, later runs reuse the on-disk result
+# - probe_keyframes: given clip starts, only the windows before them are read
+
+import os
+import subprocess
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from boris_clip.probe import (
+    _probe_keyframes_cached,
+    _probe_video_cached,
+    probe_keyframes,
+    probe_video,
+)
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+_FFPROBE_OUTPUT = {
+    "format": {"duration": "120.5"},
+    "streams": [
+        {"codec_type": "video", "r_frame_rate": "25/1"},
+        {"codec_type": "audio"},
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    _probe_video_cached.cache_clear()
+    _probe_keyframes_cached.cache_clear()
+    yield
+    _probe_video_cached.cache_clear()
+    _probe_keyframes_cached.cache_clear()
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    path = tmp_path / "recording.mp4"
+    path.write_bytes(b"not really a video")
+    return path
+
+
+# ---------------------------------------------------------------------------
+# probe_video
+# ---------------------------------------------------------------------------
+
+class TestProbeVideo:
+    @patch("boris_clip.probe._run_ffprobe", return_value=_FFPROBE_OUTPUT)
+    def test_parses_metadata(self, _mock, video_file):
+        info = probe_video(str(video_file))
+        assert info.duration == pytest.approx(120.5)
+        assert info.fps == pytest.approx(25.0)
+        assert info.has_audio
+        assert info.filename == "recording.mp4"
+
+    @patch("boris_clip.probe._run_ffprobe", return_value=_FFPROBE_OUTPUT)
+    def test_probes_each_file_once(self, mock_ffprobe, video_file, tmp_path):
+        link = tmp_path / "link.mp4"
+        link.symlink_to(video_file)
+        probe_video(str(video_file))
+        info = probe_video(str(link))
+        assert mock_ffprobe.call_count == 1
+        assert info.filename == "link.mp4"
+
+    @patch("boris_clip.probe._run_ffprobe", return_value=_FFPROBE_OUTPUT)
+    def test_modified_file_probed_again(self, mock_ffprobe, video_file):
+        probe_video(str(video_file))
+        stat = video_file.stat()
+        os.utime(video_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        probe_video(str(video_file))
+        assert mock_ffprobe.call_count == 2
+
+    @patch("boris_clip.probe._run_ffprobe", return_value=_FFPROBE_OUTPUT)
+    def test_disk_cache(self, mock_ffprobe, video_file, tmp_path, monkeypatch):
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+        first = probe_video(str(video_file), use_cache=True)
+        # A new run starts with an empty in-memory cache
+        _probe_video_cached.cache_clear()
+        assert probe_video(str(video_file), use_cache=True) == first
+        assert mock_ffprobe.call_count == 1
+
+
+# ---------------------------------------------------------------------------
+# probe_keyframes
+# ---------------------------------------------------------------------------
+
+class TestProbeKeyframes:
+    @patch("boris_clip.probe.subprocess.run")
+    def test_parses_keyframes(self, mock_run, video_file):
+        mock_run.return_value = MagicMock(
+            stdout="2.100000,__\n1.500000,K_\n1.540000,__\nN/A,K_\n3.500000,K_\n1.500000\n"
+        )
+        keyframes = probe_keyframes(str(video_file))
+        assert keyframes.tolist() == pytest.approx([0.0, 2.0])
+
+    @patch(
+        "boris_clip.probe.subprocess.run",
+        side_effect=subprocess.CalledProcessError(1, "ffprobe"),
+    )
+    def test_failure_returns_none(self, _mock, video_file):
+        assert probe_keyframes(str(video_file)) is None
+
+    @patch("boris_clip.probe.subprocess.run")
+    def test_runs_given_ffprobe(self, mock_run, video_file):
+        mock_run.return_value = MagicMock(stdout="0.000000,K_\n0.000000\n")
+        probe_keyframes(str(video_file), ffprobe_bin="/opt/ffmpeg/bin/ffprobe")
+        assert mock_run.call_args.args[0][0] == "/opt/ffmpeg/bin/ffprobe"
+
+    @patch("boris_clip.probe.subprocess.run")
+    def test_disk_cache(self, mock_run, video_file, tmp_path, monkeypatch):
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+        mock_run.return_value = MagicMock(stdout="0.000000,K_\n2.000000,K_\n0.000000\n")
+        first = probe_keyframes(str(video_file), use_cache=True)
+        _probe_keyframes_cached.cache_clear()
+        second = probe_keyframes(str(video_file), use_cache=True)
+        assert second.tolist() == first.tolist()
+        assert not second.flags.writeable
+        assert mock_run.call_count == 1
+
+    @patch("boris_clip.probe.subprocess.run")
+    def test_reads_only_around_starts(self, mock_run, video_file):
+        mock_run.side_effect = [
+            MagicMock(stdout="1.500000\n"),
+            MagicMock(stdout="1.500000,K_\n3.500000,K_\n17.500000,K_\n1.500000\n"),
+        ]
+        keyframes = probe_keyframes(str(video_file), starts=np.array([20.0, 2.0, 4.0]))
+        assert keyframes.tolist() == pytest.approx([0.0, 2.0, 16.0])
+        cmd = mock_run.call_args.args[0]
+        # Windows overlapping after the look-back are merged, and every
+        # window is shifted by the file's start time
+        assert cmd[cmd.index("-read_intervals") + 1] == (
+            "1.500000%6.500000,16.500000%22.500000"
+        )
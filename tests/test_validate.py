@@ -9,10 +9,14 @@
 # - Warning when BORIS duration differs from video duration
 # - Hard error when bout end exceeds video duration
 # - No error when bout is within bounds
+# - Out-of-bounds message lists the first five bouts and counts the rest
 # - No filename check when BORIS file has no media info
 
+from dataclasses import replace
+
 import pytest
 
+from boris_clip.cli_utils import recording_warnings
 from boris_clip.models import Bout, ParsedAnnotations, VideoInfo
 from boris_clip.validate import validate
 
@@ -21,14 +25,24 @@ from boris_clip.validate import validate
 # Fixtures
 # ---------------------------------------------------------------------------
 
-def _video(**kwargs):
-    defaults = dict(path="/data/v.mp4", filename="v.mp4", duration=60.0, fps=25.0)
-    return VideoInfo(**{**defaults, **kwargs})
+# validate never modifies its arguments, so one matching pair is built per
+# module and each test derives the variant it needs with replace()
+
+@pytest.fixture(scope="module")
+def validate_video():
+    return VideoInfo(path="/data/v.mp4", filename="v.mp4", duration=60.0, fps=25.0)
+
 
+@pytest.fixture(scope="module")
+def annotations():
+    return ParsedAnnotations(bouts=[], media_filename="v.mp4", fps=25.0, duration=60.0)
 
-def _annotations(**kwargs):
-    defaults = dict(bouts=[], media_filename="v.mp4", fps=25.0, duration=60.0)
-    return ParsedAnnotations(**{**defaults, **kwargs})
+
+def _warnings(annotations, video, force=False) -> str:
+    """Run validate and return the warnings it emitted, one per line."""
+    with recording_warnings() as messages:
+        validate(annotations, video, force=force)
+    return "\n".join(messages)
 
 
 # ---------------------------------------------------------------------------
@@ -36,25 +50,23 @@ def _annotations(**kwargs):
 # ---------------------------------------------------------------------------
 
 class TestFilenameValidation:
-    def test_matching_filenames_ok(self):
-        validate(_annotations(), _video())  # should not raise
+    def test_matching_filenames_ok(self, annotations, validate_video):
+        validate(annotations, validate_video)  # should not raise
 
-    def test_mismatch_raises(self):
-        ann = _annotations(media_filename="other.mp4")
+    def test_mismatch_raises(self, annotations, validate_video):
+        ann = replace(annotations, media_filename="other.mp4")
         with pytest.raises(SystemExit):
-            validate(ann, _video())
+            validate(ann, validate_video)
 
-    def test_mismatch_with_force_warns(self, capsys):
-        ann = _annotations(media_filename="other.mp4")
-        validate(ann, _video(), force=True)  # should not raise
-        captured = capsys.readouterr()
-        assert "Warning" in captured.err
+    def test_mismatch_with_force_warns(self, annotations, validate_video):
+        ann = replace(annotations, media_filename="other.mp4")
+        warnings = _warnings(ann, validate_video, force=True)  # should not raise
+        assert "does not match" in warnings
 
-    def test_no_media_filename_skips_check(self, capsys):
-        ann = _annotations(media_filename=None)
-        validate(ann, _video())  # should not raise
-        captured = capsys.readouterr()
-        assert "skipping filename check" in captured.err
+    def test_no_media_filename_skips_check(self, annotations, validate_video):
+        ann = replace(annotations, media_filename=None)
+        warnings = _warnings(ann, validate_video)  # should not raise
+        assert "skipping filename check" in warnings
 
 
 # ---------------------------------------------------------------------------
@@ -62,17 +74,11 @@ class TestFilenameValidation:
 # ---------------------------------------------------------------------------
 
 class TestFPSValidation:
-    def test_fps_mismatch_warns(self, capsys):
-        ann = _annotations(fps=30.0)
-        validate(ann, _video(fps=25.0))
-        captured = capsys.readouterr()
-        assert "FPS" in captured.err
+    def test_fps_mismatch_warns(self, annotations, validate_video):
+        assert "FPS" in _warnings(replace(annotations, fps=30.0), validate_video)
 
-    def test_fps_match_no_warning(self, capsys):
-        ann = _annotations(fps=25.0)
-        validate(ann, _video(fps=25.0))
-        captured = capsys.readouterr()
-        assert "FPS" not in captured.err
+    def test_fps_match_no_warning(self, annotations, validate_video):
+        assert "FPS" not in _warnings(annotations, validate_video)
 
 
 # ---------------------------------------------------------------------------
@@ -80,18 +86,14 @@ class TestFPSValidation:
 # ---------------------------------------------------------------------------
 
 class TestDurationValidation:
-    def test_duration_mismatch_warns(self, capsys):
-        ann = _annotations(duration=70.0)
-        validate(ann, _video(duration=60.0))
-        captured = capsys.readouterr()
-        assert "Duration" in captured.err or "duration" in captured.err
-
-    def test_duration_within_tolerance_ok(self, capsys):
-        ann = _annotations(duration=60.5)
-        validate(ann, _video(duration=60.0))
-        captured = capsys.readouterr()
+    def test_duration_mismatch_warns(self, annotations, validate_video):
+        ann = replace(annotations, duration=70.0)
+        assert "duration" in _warnings(ann, validate_video).lower()
+
+    def test_duration_within_tolerance_ok(self, annotations, validate_video):
+        ann = replace(annotations, duration=60.5)
         # 0.5s difference is within 1.0s tolerance
-        assert "duration" not in captured.err.lower()
+        assert "duration" not in _warnings(ann, validate_video).lower()
 
 
 # ---------------------------------------------------------------------------
@@ -99,20 +101,25 @@ class TestDurationValidation:
 # ---------------------------------------------------------------------------
 
 class TestBoutBounds:
-    def test_out_of_bounds_raises(self):
-        bout = Bout("ind1", "run", 55.0, 65.0)
-        ann = _annotations(bouts=[bout])
+    def test_out_of_bounds_raises(self, annotations, validate_video):
+        ann = replace(annotations, bouts=[Bout("ind1", "run", 55.0, 65.0)])
         with pytest.raises(SystemExit):
-            validate(ann, _video(duration=60.0))
-
-    def test_within_bounds_ok(self):
-        bout = Bout("ind1", "run", 10.0, 20.0)
-        ann = _annotations(bouts=[bout])
-        validate(ann, _video(duration=60.0))  # should not raise
-
-    def test_out_of_bounds_with_force(self, capsys):
-        bout = Bout("ind1", "run", 55.0, 65.0)
-        ann = _annotations(bouts=[bout])
-        validate(ann, _video(duration=60.0), force=True)
-        captured = capsys.readouterr()
-        assert "Warning" in captured.err
+            validate(ann, validate_video)
+
+    def test_within_bounds_ok(self, annotations, validate_video):
+        ann = replace(annotations, bouts=[Bout("ind1", "run", 10.0, 20.0)])
+        validate(ann, validate_video)  # should not raise
+
+    def test_out_of_bounds_with_force(self, annotations, validate_video):
+        ann = replace(annotations, bouts=[Bout("ind1", "run", 55.0, 65.0)])
+        warnings = _warnings(ann, validate_video, force=True)
+        assert "end after the video duration" in warnings
+
+    def test_out_of_bounds_details(self, annotations, validate_video):
+        bouts = [Bout("ind1", "run", 1.0, 2.0)]
+        bouts += [Bout("ind1", "run", 55.0, 62.0 + i) for i in range(7)]
+        err = _warnings(replace(annotations, bouts=bouts), validate_video, force=True)
+        assert "7 bout(s)" in err
+        assert "ends at 62.000s" in err and "ends at 66.000s" in err
+        assert "ends at 67.000s" not in err
+        assert "... and 2 more" in err